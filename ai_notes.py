@@ -1,13 +1,49 @@
 import os
+import sys
+import io
 import re
+import asyncio
 import ollama
+import ahocorasick
 import logging
 from datetime import datetime
-from typing import List, Optional, Tuple, Dict, Any
-from tqdm import tqdm
+from typing import Iterable, List, Optional, Tuple, Dict, Any
+from tqdm.asyncio import tqdm
 from pathlib import Path
 
 from config import ProjectConfig, logger
+from utils.llm_cache import LLMCache
+from utils.ollama_client import get_client, async_client
+from utils.chunking import split_units, iter_units, iter_cdc_chunks, with_continuation
+
+# Anything that is not a letter, digit, space, '-' or '_' is dropped from note titles
+_RE_UNSAFE_TITLE = re.compile(r'[^\w \-]')
+# A first line short enough to be a heading (optionally Markdown '#')
+_RE_HEADING_TITLE = re.compile(r'^[#\s]*(.{5,80})$')
+# Below this length the LLM metadata call costs more than it adds
+SHORT_TEXT_THRESHOLD = 1500
+# Content-defined chunk bounds; the mean chunk is used to estimate the progress total
+CHUNK_MIN_SIZE = 3000
+CHUNK_MAX_SIZE = 6000
+# Only texts shorter than this can be classified as low-signal
+LOW_SIGNAL_MAX_CHARS = 3000
+# Metadata only ever looks at the beginning of the text
+METADATA_SAMPLE_CHARS = 2000
+# Metadata is two short lines; decode cost is linear in emitted tokens, so cap it hard
+METADATA_OPTIONS = {'temperature': 0.3, 'num_predict': 60, 'stop': ['\n3.']}
+# Chunk rewrites are long but bounded (~1.5x of a 6000-char chunk) to stop runaway generations
+CHUNK_OPTIONS = {'temperature': 0.2, 'num_predict': 2048}
+
+def _build_tag_automaton(patterns: Dict[str, List[str]]) -> ahocorasick.Automaton:
+    """Compiles {tag: [keywords]} into one Aho-Corasick automaton (lowercase keyword -> tags)."""
+    automaton = ahocorasick.Automaton()
+    for tag, keywords in patterns.items():
+        for kw in keywords:
+            kw = kw.lower()
+            tags = automaton.get(kw, ())
+            automaton.add_word(kw, tags + (tag,))
+    automaton.make_automaton()
+    return automaton
 
 class TranscriptProcessor:
     """
@@ -27,46 +63,219 @@ class TranscriptProcessor:
     WYJŚCIE: Tylko czysty Markdown.
     """
 
+    COMPLIANCE_PATTERNS = {
+        "DORA": ["dora", "rezyliencja", "incydent", "ciągłość działania", "ict risk"],
+        "NIS2": ["nis2", "infrastruktura krytyczna", "dyrektywa", "bezpieczeństwo sieci"],
+        "RODO": ["rodo", "gdpr", "dane osobowe", "prywatność", "przetwarzanie"],
+        "SECURITY": ["exploit", "podatność", "cve", "pentest", "hacker"],
+        "AI": ["llm", "ai", "model", "sztuczna inteligencja", "machine learning"],
+        "PYTHON": ["python", "pip", "django", "flask", "fastapi"]
+    }
+    # Built once at class load; matches all keywords in a single pass over the text
+    _COMPLIANCE_AC = _build_tag_automaton(COMPLIANCE_PATTERNS)
+
     def __init__(self, model: Optional[str] = None):
         self.model = model or ProjectConfig.OLLAMA_MODEL
         self.fast_model = ProjectConfig.OLLAMA_MODEL_FAST
         self.logger = logging.getLogger("TranscriptProcessor")
+        self.cache = LLMCache()
+        # One pooled HTTP client shared with the rest of the app instead of ollama's module-level default
+        self._sync_client = get_client()
+        self.logger.info(
+            f"Chunk refinement runs up to {ProjectConfig.OLLAMA_NUM_PARALLEL} requests concurrently "
+            "(set OLLAMA_NUM_PARALLEL on the Ollama server to match).",
+            extra={"tags": "LLM-INIT"}
+        )
+
+    @staticmethod
+    def _heuristic_title(first_line: str) -> Optional[str]:
+        """Returns the line if it looks like a title, otherwise None."""
+        match = _RE_HEADING_TITLE.match(first_line.strip())
+        return match.group(1).strip() if match else None
+
+    def _heuristic_metadata(self, text: str) -> Optional[Tuple[str, str]]:
+        """Title/summary without an LLM call for headed or short texts."""
+        first_line, _, rest = text.lstrip().partition('\n')
+        title = self._heuristic_title(first_line)
+        if title is None:
+            if len(text) >= SHORT_TEXT_THRESHOLD:
+                return None
+            title = " ".join(text.split()[:8])
+        if not rest.strip():
+            rest = text
+
+        title = _RE_UNSAFE_TITLE.sub('', title).strip()
+        if not title:
+            return None
+        summary = next(split_units(rest.strip()), "").strip()[:200] or "Brak podsumowania."
+        return title, summary
 
     def _generate_metadata(self, text: str) -> Tuple[str, str]:
         """Uses lightweight LLM (Fast Model) to generate title and short summary."""
+        heuristic = self._heuristic_metadata(text)
+        if heuristic:
+            return heuristic
+
         prompt = "Na podstawie tekstu podaj: 1. Krótki tytuł techniczny (bez znaków specjalnych), 2. Jednozdaniowe podsumowanie."
         try:
             # Use faster, smaller model for metadata generation to save time/compute
-            resp = ollama.chat(
+            content = self._cached_chat(
                 model=self.fast_model,
-                messages=[{'role': 'user', 'content': f"{prompt}\n\nTekst: {text[:2000]}"}]
+                messages=[{'role': 'user', 'content': f"{prompt}\n\nTekst: {text[:METADATA_SAMPLE_CHARS]}"}],
+                options=METADATA_OPTIONS,
+                max_lines=2
             )
-            content = resp['message']['content']
-            lines = content.split('\n')
+            lines = [line for line in content.split('\n') if line.strip()]
             title = lines[0].strip().replace("1. ", "").replace("Tytuł: ", "")
             summary = lines[1].strip().replace("2. ", "").replace("Podsumowanie: ", "") if len(lines) > 1 else "Brak podsumowania."
             # Sanitize title
-            title = "".join(c for c in title if c.isalnum() or c in " -_").strip()
+            title = _RE_UNSAFE_TITLE.sub('', title).strip()
             return title, summary
         except Exception:
             return "Note-" + datetime.now().strftime("%Y%m%d-%H%M"), "Automatyczna notatka."
 
+    @staticmethod
+    def _run_async(coro_factory):
+        """
+        Runs `coro_factory(async_client)` on a fresh loop with a per-call client (pooled for all chunks of the note).
+        Callers include short-lived threads (asyncio.to_thread in BrainGuard), so neither may outlive the call.
+        """
+        async def run():
+            async with async_client() as client:
+                return await coro_factory(client)
+        return asyncio.run(run())
+
+    def _chat(self, model: str, messages: List[Dict[str, str]], options: Dict[str, Any], max_lines: Optional[int] = None) -> str:
+        """Sync chat; with `max_lines` the response is streamed and cut once that many non-empty lines are complete."""
+        if not max_lines:
+            return self._sync_client.chat(model=model, messages=messages, options=options)['message']['content']
+
+        content = ""
+        stream = self._sync_client.chat(model=model, messages=messages, options=options, stream=True)
+        try:
+            for part in stream:
+                content += part['message']['content']
+                done_lines = [line for line in content.split('\n')[:-1] if line.strip()]
+                if len(done_lines) >= max_lines:
+                    break
+        finally:
+            # Closing the generator drops the HTTP stream, Ollama stops decoding
+            if hasattr(stream, 'close'):
+                stream.close()
+        return content
+
+    def _cached_chat(self, model: str, messages: List[Dict[str, str]], options: Dict[str, Any], max_lines: Optional[int] = None) -> str:
+        """Chat call with an exact-match response cache for low-temperature prompts."""
+        if not LLMCache.is_cacheable(options):
+            return self._chat(model, messages, options, max_lines)
+
+        key = LLMCache.make_key(model, messages, options)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        content = self._chat(model, messages, options, max_lines)
+        self.cache.set(key, content)
+        return content
+
+    async def _cached_chat_async(self, client: ollama.AsyncClient, model: str, messages: List[Dict[str, str]], options: Dict[str, Any],
+                                 key: Optional[str] = None) -> str:
+        """Async counterpart of _cached_chat used by the chunk dispatcher; `key` overrides the cache key built from `messages`."""
+        if not LLMCache.is_cacheable(options):
+            return (await client.chat(model=model, messages=messages, options=options))['message']['content']
+
+        key = key or LLMCache.make_key(model, messages, options)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        content = (await client.chat(model=model, messages=messages, options=options))['message']['content']
+        self.cache.set(key, content)
+        return content
+
+    @staticmethod
+    def chunk_cache_key(model: str, system_prompt: str, chunk: str) -> str:
+        """
+        Cache key of a refined chunk: model, prompt and chunk text only. The fragment number and continuation
+        prefix stay out, so an edit that shifts the numbering still hits the cache for every unchanged chunk.
+        """
+        return LLMCache.make_key(model, [{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': chunk}], CHUNK_OPTIONS)
+
+    def _scan_compliance(self, text: str, found: set):
+        """Adds compliance tags matched in `text` to `found` (one Aho-Corasick pass)."""
+        for _, tags in self._COMPLIANCE_AC.iter(text.lower()):
+            found.update(tags)
+
+    def _compliance_tags(self, found: set) -> List[str]:
+        return [tag for tag in self.COMPLIANCE_PATTERNS if tag in found] or ["GENERAL"]
+
     def _detect_compliance_tags(self, text: str) -> List[str]:
-        """Advanced Compliance Tagging (DORA/NIS2/RODO)."""
-        tags = []
-        text_lower = text.lower()
-        patterns = {
-            "DORA": ["dora", "rezyliencja", "incydent", "ciągłość działania", "ict risk"],
-            "NIS2": ["nis2", "infrastruktura krytyczna", "dyrektywa", "bezpieczeństwo sieci"],
-            "RODO": ["rodo", "gdpr", "dane osobowe", "prywatność", "przetwarzanie"],
-            "SECURITY": ["exploit", "podatność", "cve", "pentest", "hacker"],
-            "AI": ["llm", "ai", "model", "sztuczna inteligencja", "machine learning"],
-            "PYTHON": ["python", "pip", "django", "flask", "fastapi"]
-        }
-        for tag, keywords in patterns.items():
-            if any(kw in text_lower for kw in keywords):
-                tags.append(tag)
-        return tags or ["GENERAL"]
+        """Advanced Compliance Tagging (DORA/NIS2/RODO) in one Aho-Corasick pass."""
+        found = set()
+        self._scan_compliance(text, found)
+        return self._compliance_tags(found)
+
+    def _is_low_signal(self, text: str) -> bool:
+        """Short texts with almost no technical keywords (outros, "dajcie suba") are not worth an LLM call."""
+        if len(text) >= LOW_SIGNAL_MAX_CHARS:
+            return False
+        hits = sum(1 for _ in self._COMPLIANCE_AC.iter(text.lower()))
+        return hits / max(len(text) / 1000, 1) < ProjectConfig.MIN_SIGNAL_DENSITY
+
+    async def _process_chunks_async(self, client: ollama.AsyncClient, chunks: Iterable[str], system_prompt: str,
+                                    found_tags: set, total_estimate: Optional[int] = None) -> List[Optional[str]]:
+        """
+        Sends chunks to Ollama with at most OLLAMA_NUM_PARALLEL requests in flight.
+        `chunks` is consumed lazily, so only the in-flight window is held in memory.
+        Returns a list indexed like `chunks` (None for failed chunks); compliance tags
+        are collected into `found_tags` as each response arrives.
+        """
+        window = ProjectConfig.OLLAMA_NUM_PARALLEL or 4
+        source = enumerate(with_continuation(chunks))
+        results: List[Optional[str]] = []
+        pending = set()
+
+        async def refine(i: int, chunk: str, continuation: bool):
+            prefix = "(kontynuacja poprzedniego fragmentu) " if continuation else ""
+            try:
+                return i, await self._cached_chat_async(
+                    client,
+                    model=self.model,
+                    messages=[
+                        {'role': 'system', 'content': system_prompt},
+                        {'role': 'user', 'content': f"{prefix}Przetwórz fragment {i+1} (zachowaj ciągłość):\n{chunk}"}
+                    ],
+                    options=CHUNK_OPTIONS,
+                    key=self.chunk_cache_key(self.model, system_prompt, chunk)
+                )
+            except Exception as e:
+                return i, e
+
+        def refill():
+            while len(pending) < window:
+                item = next(source, None)
+                if item is None:
+                    return
+                i, (chunk, continuation) = item
+                results.append(None)
+                pending.add(asyncio.ensure_future(refine(i, chunk, continuation)))
+
+        with tqdm(total=total_estimate, desc="Refining Content", disable=not sys.stderr.isatty()) as bar:
+            refill()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending -= done
+                for task in done:
+                    i, resp = task.result()
+                    bar.update(1)
+                    if isinstance(resp, Exception):
+                        self.logger.error(f"Chunk error: {resp}")
+                        continue
+                    results[i] = resp
+                    self._scan_compliance(resp, found_tags)
+                refill()
+            # The total was an estimate from the text length
+            bar.total = len(results)
+            bar.refresh()
+        return results
 
     def generate_note_content_from_text(self, text: str, meta: Dict[str, Any] = None, style: str = "Academic") -> Dict[str, Any]:
         """
@@ -75,16 +284,46 @@ class TranscriptProcessor:
         if not text:
             return {"title": "Empty Note", "content": "", "tags": []}
 
-        # 1. Metadata
-        title, summary = self._generate_metadata(text)
+        if self._is_low_signal(text):
+            return self._low_signal_stub(text, meta)
+
+        # Content-defined chunks, so unchanged passages map to cached responses
+        chunks = iter_cdc_chunks(split_units(text), min_size=CHUNK_MIN_SIZE, max_size=CHUNK_MAX_SIZE)
+        return self._generate_from_chunks(chunks, text[:METADATA_SAMPLE_CHARS], len(text), meta=meta, style=style)
+
+    def _low_signal_stub(self, text: str, meta: Dict[str, Any] = None) -> Dict[str, Any]:
+        self.logger.info("Low-signal text, skipping LLM refinement.", extra={"tags": "LLM-SKIP"})
+        title, summary = self._heuristic_metadata(text) or (
+            "Note-" + datetime.now().strftime("%Y%m%d-%H%M"), "Automatyczna notatka.")
+        return {
+            "title": self._meta_title(meta) or title,
+            "content": text, # Kept verbatim, nothing to refine
+            "summary": summary,
+            "tags": ["low-signal"] + self._source_tags(meta)
+        }
+
+    @staticmethod
+    def _meta_title(meta: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Sanitized payload title (YouTube/audio), preferred over generated ones."""
         if meta and meta.get('title') and meta.get('title') != "Unknown Title":
-             # Prefer metadata title but sanitize it
-             title = "".join(c for c in meta['title'] if c.isalnum() or c in " -_").strip()
+            return _RE_UNSAFE_TITLE.sub('', meta['title']).strip() or None
+        return None
 
-        # 2. Context Chunking
-        chunks = [text[i:i+6000] for i in range(0, len(text), 5000)]
-        full_body = []
+    @staticmethod
+    def _source_tags(meta: Optional[Dict[str, Any]]) -> List[str]:
+        return [f"source/{meta.get('uploader', 'unknown').lower().replace(' ', '_')}"] if meta else []
 
+    def _generate_from_chunks(self, chunks: Iterable[str], head: str, text_len: int, meta: Dict[str, Any] = None, style: str = "Academic") -> Dict[str, Any]:
+        """
+        Shared Refinery pipeline; `head` is the beginning of the text used for metadata,
+        `text_len` sizes the progress bar since `chunks` may be a lazy generator.
+        """
+        # 1. Metadata
+        title, summary = self._generate_metadata(head)
+        # Prefer metadata title but sanitize it
+        title = self._meta_title(meta) or title
+
+        # 2. Context Chunking
         # Adjust system prompt based on style
         style_instruction = ""
         if style == "Bullet Points": style_instruction = "Używaj głównie list wypunktowanych."
@@ -92,25 +331,18 @@ class TranscriptProcessor:
         
         system_prompt = self.SYSTEM_PROMPT + f"\nSTYL: {style_instruction}"
 
-        for i, chunk in enumerate(tqdm(chunks, desc="Refining Content")):
-            try:
-                resp = ollama.chat(
-                    model=self.model,
-                    messages=[
-                        {'role': 'system', 'content': system_prompt},
-                        {'role': 'user', 'content': f"Przetwórz fragment {i+1} (zachowaj ciągłość):\n{chunk}"}
-                    ]
-                )
-                full_body.append(resp['message']['content'])
-            except Exception as e:
-                self.logger.error(f"Chunk error: {e}")
-
-        combined_body = "\n\n".join(full_body)
+        found_tags: set = set()
+        estimate = -(-text_len // ((CHUNK_MIN_SIZE + CHUNK_MAX_SIZE) // 2))
+        full_body = self._run_async(
+            lambda client: self._process_chunks_async(client, chunks, system_prompt, found_tags, total_estimate=estimate)
+        )
+        if full_body and all(part is None for part in full_body):
+            # Ollama down or every request failed: an empty note must not be saved (or memoized by the app)
+            raise RuntimeError(f"All {len(full_body)} chunks failed, no note generated.")
+        combined_body = "\n\n".join(part for part in full_body if part is not None)
         
-        # 3. Tagging
-        tags = self._detect_compliance_tags(combined_body)
-        if meta:
-            tags.append(f"source/{meta.get('uploader', 'unknown').lower().replace(' ', '_')}")
+        # 3. Tagging (already collected per chunk, no re-scan of the joined body)
+        tags = self._compliance_tags(found_tags) + self._source_tags(meta)
 
         return {
             "title": title,
@@ -119,8 +351,29 @@ class TranscriptProcessor:
             "tags": tags
         }
 
+    @staticmethod
+    def _open_transcript(path: Path) -> io.TextIOWrapper:
+        """Opens a transcript with a 1 MiB raw buffer and 256 KiB decode chunks (fewer syscalls on /mnt/c)."""
+        raw = open(path, 'rb', buffering=1024 * 1024)
+        reader = io.TextIOWrapper(raw, encoding='utf-8')
+        reader._CHUNK_SIZE = 262144
+        return reader
+
     # Legacy wrapper for compatibility if needed, but App uses the method above now
     def generate_note_content(self, transcript_file: str) -> Dict[str, Any]:
         path = Path(transcript_file)
-        if not path.exists(): return {"error": "File not found"}
-        return self.generate_note_content_from_text(path.read_text(encoding='utf-8'))
+        try:
+            size = path.stat().st_size  # one stat answers both "exists?" and "how big?"
+        except FileNotFoundError:
+            return {"error": "File not found"}
+        # st_size counts bytes and UTF-8 Polish text takes 1-4 per character: every file that can
+        # be under LOW_SIGNAL_MAX_CHARS characters goes through the in-memory (low-signal checked) path
+        if size < LOW_SIGNAL_MAX_CHARS * 4:
+            # Tiny file, the in-memory path handles empty and low-signal texts
+            return self.generate_note_content_from_text(path.read_text(encoding='utf-8'))
+        with self._open_transcript(path) as f:
+            head = f.read(METADATA_SAMPLE_CHARS)
+            f.seek(0)
+            # Chunks are read from the file as the dispatcher needs them, the full text is never held in memory
+            chunks = iter_cdc_chunks(iter_units(f), min_size=CHUNK_MIN_SIZE, max_size=CHUNK_MAX_SIZE)
+            return self._generate_from_chunks(chunks, head, size)
@@ -1,17 +1,25 @@
 import os
+import sys
+import asyncio
+import concurrent.futures
 import argparse
+import aiofiles
 import requests
 from bs4 import BeautifulSoup
-import ollama
 import re
 import logging
 from datetime import datetime
-from tqdm import tqdm
+from tqdm.asyncio import tqdm
 from typing import List, Tuple, Optional
 from pathlib import Path
 
 from config import ProjectConfig, logger
 from obsidian_manager import ObsidianGardener
+from utils.chunking import chunk_text
+from utils.ollama_client import async_client
+
+_RE_STRIP = re.compile(r'[^\w\s-]')
+_RE_DASH = re.compile(r'[\s_-]+')
 
 class WebResearcher:
     """
@@ -34,13 +42,27 @@ class WebResearcher:
         self.model = model or ProjectConfig.OLLAMA_MODEL
         self.output_dir = self.vault_path / "Research"
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.gardener = gardener or ObsidianGardener()
+        # Auto-linking of saved notes runs here, overlapping with the next article's LLM calls
+        self._post_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="research-post")
+        # Caller's instance when given, so the vault is not indexed again
+        self._gardener = gardener
+
+    @property
+    def gardener(self) -> ObsidianGardener:
+        if self._gardener is None:
+            self._gardener = ObsidianGardener()
+        return self._gardener
+
+    @staticmethod
+    def _log_post_error(future: concurrent.futures.Future):
+        """Done-callback for auto-linking jobs: nobody waits on them, so errors are logged here."""
+        error = None if future.cancelled() else future.exception()
+        if error is not None:
+            logger.error(f"Auto-linking failed: {error}", extra={"tags": "WEB-ERROR"})
 
     @staticmethod
     def clean_filename(title: str) -> str:
-        title = title.lower()
-        title = re.sub(r'[^\w\s-]', '', title)
-        return re.sub(r'[\s_-]+', '-', title).strip('-')
+        return _RE_DASH.sub('-', _RE_STRIP.sub('', title.lower())).strip('-')
 
     def fetch_article_content(self, url: str) -> Tuple[Optional[str], Optional[str]]:
         logger.info(f"Fetching: {url}", extra={"tags": "WEB-RESEARCH"})
@@ -63,57 +85,65 @@ class WebResearcher:
             return None, None
 
     def process_url(self, url: str) -> bool:
-        title, text = self.fetch_article_content(url)
+        """Sync wrapper for CLI/BrainGuard callers."""
+        return asyncio.run(self.process_url_async(url))
+
+    async def process_url_async(self, url: str) -> bool:
+        title, text = await asyncio.to_thread(self.fetch_article_content, url)
         if not text: return False
 
         safe_title = self.clean_filename(title)[:60]
         
-        # Split into chunks if necessary
-        chunks = [text[i:i+6000] for i in range(0, len(text), 5500)]
-        full_notes = []
-        
-        for i, chunk in enumerate(tqdm(chunks, desc="AI Analysis")):
+        # Split into chunks if necessary (content-defined boundaries)
+        chunks = chunk_text(text, max_size=6000)
+        sem = asyncio.Semaphore(ProjectConfig.OLLAMA_NUM_PARALLEL or 4)
+
+        async def analyze(client, i: int, chunk: str) -> Optional[str]:
             try:
-                resp = ollama.chat(model=self.model, messages=[
-                    {'role': 'system', 'content': self.SYSTEM_PROMPT},
-                    {'role': 'user', 'content': f"Fragment {i+1}:\n{chunk}"}
-                ])
-                full_notes.append(resp['message']['content'])
+                async with sem:
+                    resp = await client.chat(model=self.model, messages=[
+                        {'role': 'system', 'content': self.SYSTEM_PROMPT},
+                        {'role': 'user', 'content': f"Fragment {i+1}:\n{chunk}"}
+                    ])
+                return resp['message']['content']
             except Exception as e:
                 logger.error(f"AI Error: {e}")
+                return None
+
+        # process_url runs on a fresh loop per call, so the client lives only for this article
+        async with async_client() as client:
+            results = await tqdm.gather(*(analyze(client, i, c) for i, c in enumerate(chunks)), desc="AI Analysis", disable=not sys.stderr.isatty())
+        full_notes = [r for r in results if r is not None]
 
-        return self.save_note(safe_title, title, url, full_notes)
+        return await self.save_note_async(safe_title, title, url, full_notes)
 
     def save_note(self, safe_title: str, original_title: str, url: str, notes_list: List[str]) -> bool:
+        return asyncio.run(self.save_note_async(safe_title, original_title, url, notes_list))
+
+    async def save_note_async(self, safe_title: str, original_title: str, url: str, notes_list: List[str]) -> bool:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
         filename = f"{datetime.now().strftime('%Y-%m-%d')}-web-{safe_title}.md"
         filepath = self.output_dir / filename
         
-        joined_notes = "\n\n".join(notes_list)
-
-        content = f"""
----
-created: {timestamp}
-tags: [research, web, ai-generated]
-source: {url}
-status: to-read
----
-
-# Research: {original_title}
-
-> **Source:** [{url}]({url})
-
----
-## Analiza AI
-
-{joined_notes}
-
----
-*Generated by WebResearcher (Architect Edition)*
-"""
-        filepath.write_text(content, encoding='utf-8')
+        header = (
+            f"\n---\ncreated: {timestamp}\ntags: [research, web, ai-generated]\nsource: {url}\nstatus: to-read\n---\n\n"
+            f"# Research: {original_title}\n\n> **Source:** [{url}]({url})\n\n---\n## Analiza AI\n\n"
+        )
+        # One join over all parts instead of joining the notes and then copying them into a template
+        parts = [header]
+        for i, note in enumerate(notes_list):
+            if i:
+                parts.append("\n\n")
+            parts.append(note)
+        parts.append("\n\n---\n*Generated by WebResearcher (Architect Edition)*\n")
+        content = "".join(parts)
+
+        # Non-blocking write, the event loop keeps serving LLM calls during the flush
+        async with aiofiles.open(filepath, 'w', encoding='utf-8') as f:
+            await f.write(content)
         logger.info(f"Research saved: {filepath}", extra={"tags": "NOTE-SAVE"})
         
-        # Auto-link concepts
-        self.gardener.process_file(str(filepath))
+        # Auto-link concepts in the background, the caller can move on to the next URL
+        # (pending jobs still finish at exit: executor threads are joined by the interpreter)
+        self._post_pool.submit(self.gardener.process_file, str(filepath)).add_done_callback(self._log_post_error)
         return True
@@ -1,20 +1,39 @@
 import streamlit as st
 import os
-import json
+import sys
 import time
+import asyncio
 import logging
+import threading
+import importlib
+import itertools
+import heapq
+import re
+import hashlib
+import httpx
+import orjson
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List
+from types import MappingProxyType
+from urllib.parse import quote
+from typing import AsyncIterator, Callable, Dict, Final, Iterator, List, Mapping, Optional, Tuple
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
 
 # --- CONFIG ---
 from config import ProjectConfig, logger
 
 # --- MODULES ---
-# Ingest Modules
-from video_transcriber import VideoTranscriber
-# Refinery Modules
-from ai_notes import TranscriptProcessor
-from obsidian_manager import ObsidianGardener
+# Heavy modules (torch, whisper, chromadb, LLM clients) are imported on first use by the page that needs them
+from utils import inbox
+from utils.fs import count_md_files, read_tail, save_stream
+from utils.static_audio import audio_source, prune_audio_links
+
+@st.cache_resource(show_spinner=False)
+def _lazy(name: str):
+    return importlib.import_module(name)
 
 # Initialize Page
 st.set_page_config(page_title="Obsidian AI Bridge v4.0 (ETL)", layout="wide", page_icon="⚡")
@@ -42,128 +61,577 @@ st.markdown("""
 
 # --- UTILS ---
 
-def load_inbox_items() -> List[Path]:
-    """Scans INBOX_DIR for ready JSON files."""
+# UI label -> TranscriptProcessor style key
+_STYLE_MAP: Final[Mapping[str, str]] = MappingProxyType({
+    "Akademicki": "Academic",
+    "Blog Post": "Blog Post",
+    "Wypunktowanie": "Bullet Points",
+    "Podsumowanie": "Summary"
+})
+
+# Inbox entries offered in the Refinery selectbox (newest first)
+INBOX_DISPLAY_LIMIT = 50
+
+# Audio formats accepted by the local ingest (upload and batch directory)
+AUDIO_EXTENSIONS = ('mp3', 'wav', 'm4a', 'ogg')
+
+# Chat messages kept in session (10 turns); older ones drop out of the view
+CHAT_HISTORY_MAXLEN = 20
+
+# Newest messages drawn as chat bubbles; older ones go into one collapsed markdown block
+CHAT_VISIBLE_MESSAGES = 6
+CHAT_ROLE_LABELS: Final[Mapping[str, str]] = MappingProxyType({"user": "🧑 Ty", "assistant": "🤖 AI"})
+
+# Previous turns (question + answer) sent to the model with each new question
+HISTORY_TURNS = 8
+
+# Minimum seconds between chat placeholder re-renders while streaming (20 Hz)
+STREAM_FLUSH_INTERVAL = 0.05
+
+# Markdown shown in place of reasoning models' <think> tags
+THINK_TAGS: Final[Mapping[str, str]] = MappingProxyType({
+    "<think>": "💭 *Rozumowanie modelu:*\n\n",
+    "</think>": "\n\n---\n\n",
+})
+_THINK_RE = re.compile("|".join(map(re.escape, THINK_TAGS)))
+
+def _render_think_tag(match: re.Match) -> str:
+    return THINK_TAGS[match.group()]
+
+def _dir_signature(path: Path) -> int:
+    """Directory mtime; changes whenever a file is added, removed or renamed."""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+class _InboxWatch(FileSystemEventHandler):
+    """Bumps `generation` whenever an inbox entry changes, so reruns compare a counter instead of touching the disk."""
+
+    # open/close events (e.g. the UI reading a header) do not change the listing
+    _CHANGES = frozenset({"created", "deleted", "moved", "modified"})
+
+    def __init__(self):
+        self.generation = 0
+
+    def on_any_event(self, event):
+        if event.event_type in self._CHANGES:
+            self.generation += 1
+
+@st.cache_resource(show_spinner=False)
+def get_inbox_watch() -> Optional[_InboxWatch]:
+    """Native (inotify) observer on INBOX_DIR, started once per server; None if it cannot start."""
+    handler = _InboxWatch()
+    try:
+        ProjectConfig.INBOX_DIR.mkdir(parents=True, exist_ok=True)
+        observer = Observer()
+        observer.daemon = True
+        observer.schedule(handler, str(ProjectConfig.INBOX_DIR), recursive=False)
+        observer.start()
+    except Exception as e:  # e.g. inotify watch limit reached
+        logger.warning(f"Inbox watcher unavailable, falling back to mtime checks: {e}", extra={"tags": "INBOX"})
+        return None
+    return handler
+
+def _inbox_signature() -> int:
+    watch = get_inbox_watch()
+    if watch is None:
+        return _dir_signature(ProjectConfig.INBOX_DIR)
+    return watch.generation
+
+@st.cache_data(ttl=5, show_spinner=False)
+def load_inbox_items(signature: int = 0) -> List[str]:
+    """
+    Scans INBOX_DIR for ready JSON files (as path strings). The first INBOX_DISPLAY_LIMIT entries are the
+    newest, in order; the rest (only counted or batch-processed) stay unsorted.
+    Cached per `signature` so reruns skip the filesystem; callers build Path objects only for what they show.
+    """
     if not ProjectConfig.INBOX_DIR.exists():
         return []
-    # Sort by modification time (newest first)
-    files = list(ProjectConfig.INBOX_DIR.glob("*.json"))
-    files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-    return files
+    # One scandir pass; the stat comes with the directory entry
+    with os.scandir(ProjectConfig.INBOX_DIR) as it:
+        entries = [(e.stat().st_mtime, e.path) for e in it if inbox.is_payload_name(e.name) and e.is_file()]
+    # Partial sort: O(N log K) for the displayed window instead of sorting the whole inbox
+    newest = heapq.nlargest(INBOX_DISPLAY_LIMIT, entries)
+    shown = {p for _, p in newest}
+    return [p for _, p in newest] + [p for _, p in entries if p not in shown]
+
+@st.cache_data(ttl=5, show_spinner=False)
+def load_local_audio(signature: int = 0) -> Tuple[str, ...]:
+    """
+    Audio files waiting in TEMP_DIR (top level only, sorted). Transcribed files live in the
+    `transcribed/` subdirectory, so no name-based filtering is needed.
+    """
+    try:
+        with os.scandir(ProjectConfig.TEMP_DIR) as it:
+            return tuple(sorted(
+                e.path for e in it
+                if e.name.rpartition('.')[2].lower() in AUDIO_EXTENSIONS and e.is_file()
+            ))
+    except FileNotFoundError:
+        return ()
 
-def get_file_summary(path: Path) -> dict:
-    """Reads metadata from JSON safely."""
+def _read_title(path_str: str) -> str:
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        meta = data.get('meta', {})
-        return {
-            "title": meta.get('title', path.stem),
-            "date": time.strftime('%Y-%m-%d %H:%M', time.localtime(data.get('processed_at', 0))),
-            "path": path,
-            "data": data
-        }
+        return inbox.read_header(Path(path_str)).get('title') or Path(path_str).stem
+    except Exception:  # corrupt or unreadable payload
+        return _CORRUPT_HEADER.title
+
+@st.cache_data(ttl=5, show_spinner=False)
+def inbox_display_options(signature: int = 0) -> Tuple[Tuple[str, ...], Dict[str, str], Dict[str, str]]:
+    """
+    Selectbox names (newest first), name -> path and name -> title for the displayed window, built once per inbox state.
+    Headers are read concurrently: a window of cold sidecars costs about one read, not INBOX_DISPLAY_LIMIT serial ones.
+    """
+    shown = load_inbox_items(signature)[:INBOX_DISPLAY_LIMIT]
+    # Runs once per inbox change, like the listing itself
+    prune_audio_links()
+    by_name = {os.path.basename(p): p for p in shown}
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        titles = dict(zip(by_name, pool.map(_read_title, by_name.values())))
+    return tuple(by_name), by_name, titles
+
+def clear_inbox_cache():
+    load_inbox_items.clear()
+    inbox_display_options.clear()
+
+@dataclass(frozen=True)
+class InboxHeader:
+    """Display metadata of one inbox payload (what the Refinery needs before the Generate click)."""
+    title: str
+    date: str = ""
+    audio: str = ""
+
+_CORRUPT_HEADER = InboxHeader(title="Uszkodzony Plik")
+
+@st.cache_data(show_spinner=False)
+def _load_header(path_str: str, mtime_ns: int, size: int) -> InboxHeader:
+    """Cached per file version; a small frozen record instead of the raw dict keeps cache hashing cheap."""
+    try:
+        header = inbox.read_header(Path(path_str))
+        return InboxHeader(
+            title=header.get('title') or Path(path_str).stem,
+            date=time.strftime('%Y-%m-%d %H:%M', time.localtime(header.get('processed_at') or 0)),
+            audio=header.get('audio') or "",
+        )
+    except Exception:  # corrupt or unreadable payload
+        return _CORRUPT_HEADER
+
+@st.cache_data(show_spinner=False)
+def _load_preview(path_str: str, mtime_ns: int, size: int) -> Optional[str]:
+    """Transcript preview from the header sidecar; the payload (content + segments) is not parsed."""
+    try:
+        return inbox.read_header(Path(path_str)).get('preview', '')
     except Exception:
-        return {"title": "Uszkodzony Plik", "path": path, "data": None}
+        return None
 
-def process_single_file(file_path: Path, style="Academic", gardener_instance=None):
-    """Logic extracted for batch processing."""
-    summary = get_file_summary(file_path)
-    data = summary['data']
-    if not data: return False
+def get_file_header(path: Path) -> InboxHeader:
+    """Reads display metadata from the inbox sidecar (never the transcript body)."""
+    try:
+        st_file = path.stat()
+    except OSError:
+        return _CORRUPT_HEADER
+    return _load_header(str(path), st_file.st_mtime_ns, st_file.st_size)
+
+def get_file_preview(path: Path) -> Optional[str]:
+    try:
+        st_file = path.stat()
+    except OSError:
+        return None
+    return _load_preview(str(path), st_file.st_mtime_ns, st_file.st_size)
+
+def get_file_payload(path: Path) -> Optional[dict]:
+    """Full payload; only loaded when the file is actually processed."""
+    try:
+        return inbox.read_payload(path)
+    except Exception:
+        return None
+
+@st.cache_resource(show_spinner=False)
+def get_processor():
+    return _lazy("ai_notes").TranscriptProcessor()
+
+@st.cache_resource(show_spinner="Indeksowanie notatek do auto-linkowania...")
+def get_gardener():
+    """One gardener (vault scan + FlashText automaton) shared by all reruns and sessions."""
+    return _lazy("obsidian_manager").ObsidianGardener()
+
+@st.cache_resource(show_spinner=False)
+def get_refinery_pool() -> ThreadPoolExecutor:
+    """Persistent LLM note-generation workers; jobs keep running while the user queues more or ingests."""
+    return ThreadPoolExecutor(max_workers=max(1, ProjectConfig.REFINERY_WORKERS), thread_name_prefix="refinery")
+
+@st.cache_resource(show_spinner="Ładowanie silnika wektorowego (ChromaDB)...")
+def get_rag():
+    """ChromaDB client + embedding setup, loaded once per process instead of once per session."""
+    return _lazy("rag_engine").ObsidianRAG()
+
+@st.cache_resource(show_spinner=False)
+def get_researcher():
+    return _lazy("ai_research").WebResearcher(gardener=get_gardener())
+
+@st.cache_resource(show_spinner=False)
+def get_news_agent():
+    return _lazy("news_agent").NewsAgent(rag=get_rag(), gardener=get_gardener(), researcher=get_researcher())
+
+def _warm_ollama():
+    from utils.ollama_client import get_client
+    client = get_client()
+    try:
+        client.generate(model=ProjectConfig.OLLAMA_MODEL, prompt="")  # empty prompt only loads the model
+        client.embed(model=ProjectConfig.EMBEDDING_MODEL, input=" ")
+    except Exception as e:
+        logger.warning(f"Ollama warm-up failed: {e}", extra={"tags": "OLLAMA"})
+
+@st.cache_resource(show_spinner=False)
+def start_ollama_warmup() -> threading.Thread:
+    """Once per server: loads the RAG models on a daemon thread while the UI renders."""
+    thread = threading.Thread(target=_warm_ollama, name="ollama-warmup", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_transcriber(model_size: str):
+    """
+    One transcriber per model size; Whisper weights are loaded per run and freed after,
+    or held by transcriber_server.py when it runs.
+    """
+    return _lazy("video_transcriber").create_transcriber(model_size=model_size)
+
+@st.cache_data(ttl=2, show_spinner=False)
+def tail_lines(path: str, size: int, mtime_ns: int, n: int = 10) -> List[str]:
+    """Last `n` lines of a log, read backwards from the end (size/mtime key the cache)."""
+    return [line.decode("utf-8", errors="replace") for line in read_tail(path, n)]
+
+def load_chat_history(maxlen: int = CHAT_HISTORY_MAXLEN) -> deque:
+    """Last `maxlen` messages from the chat log; only the file's tail is read."""
+    messages = deque(maxlen=maxlen)
+    try:
+        lines = read_tail(ProjectConfig.CHAT_HISTORY_FILE, maxlen)
+    except FileNotFoundError:
+        return messages
+    for line in lines:
+        try:
+            messages.append(orjson.loads(line))
+        except orjson.JSONDecodeError:
+            continue
+    return messages
+
+def append_chat_message(message: dict):
+    """Adds a message to the session and appends it (one JSON line) to the chat log."""
+    st.session_state.messages.append(message)
+    try:
+        with open(ProjectConfig.CHAT_HISTORY_FILE, "ab") as f:
+            f.write(orjson.dumps(message) + b"\n")
+    except OSError as e:
+        logger.warning(f"Chat log write failed: {e}", extra={"tags": "RAG-CHAT"})
+
+def iter_async(agen: AsyncIterator[str]) -> Iterator[str]:
+    """Drives an async generator from the (sync) Streamlit script thread."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
+
+def format_think_tags(pieces: Iterator[str]) -> Iterator[str]:
+    """
+    Renders reasoning models' <think> blocks readably. Meant to run on throttle_stream's flushes, so the
+    regex runs once per render, not per token; a flush ending in a partial tag is held back until it completes.
+    """
+    carry = ""
+    for piece in pieces:
+        if not carry and "<" not in piece:
+            yield piece
+            continue
+        text = carry + piece
+        cut = len(text) - _partial_tag_len(text)
+        carry = text[cut:]
+        yield _THINK_RE.sub(_render_think_tag, text[:cut])
+    if carry:
+        yield carry
+
+def _partial_tag_len(text: str) -> int:
+    """Length of a trailing incomplete <think>/</think> tag, 0 if there is none."""
+    tail = text[text.rfind("<"):] if "<" in text else ""
+    return len(tail) if any(tag != tail and tag.startswith(tail) for tag in THINK_TAGS) else 0
+
+def throttle_stream(pieces: Iterator[str], interval: float = STREAM_FLUSH_INTERVAL) -> Iterator[str]:
+    """Coalesces token pieces so the consumer re-renders at most once per `interval`."""
+    pending = []
+    last_flush = time.monotonic()
+    for piece in pieces:
+        if not piece:  # Ollama's final (done) chunk carries no text
+            continue
+        pending.append(piece)
+        now = time.monotonic()
+        if now - last_flush >= interval:
+            yield "".join(pending)
+            pending = []
+            last_flush = now
+    if pending:
+        yield "".join(pending)
+
+@st.fragment
+def render_log_tail():
+    """BrainGuard log tail; the refresh button reruns only this fragment."""
+    log_file = Path("brain_guard.log")
+    try:
+        st_log = log_file.stat()
+    except FileNotFoundError:
+        st_log = None
+    if st_log:
+        # Czytamy tylko końcówkę pliku
+        lines = tail_lines(str(log_file), st_log.st_size, st_log.st_mtime_ns)
+        st.code("\n".join(lines), language="bash")
+        st.button("Odśwież log")
+    else:
+        st.warning("Brak pliku logów.")
+
+@st.fragment(run_every=0.5)
+def render_ingest_progress():
+    """Polls the background ingest job started on the Ingest page."""
+    job = st.session_state.get("ingest_job")
+    if job is None:
+        return
+    messages = job.drain()
+    if not job.future.done():
+        with st.status("Pobieranie i transkrypcja w tle...", expanded=True):
+            for msg in messages[-5:]:
+                st.write(f"🔄 {msg}")
+        return
+
+    job.close()
+    del st.session_state.ingest_job
+    try:
+        json_path = job.future.result()
+        st.toast(f"Zapisano dane w Inbox: {Path(json_path).name}", icon="✅")
+        st.balloons()
+    except Exception as e:
+        st.error(f"❌ Błąd Krytyczny: {e}")
+        logger.error(f"Ingest Error: {e}")
+    clear_inbox_cache()
+    # Full rerun so the sidebar inbox counter picks up the new file
+    st.rerun()
+
+@st.cache_data(show_spinner=False)
+def config_dump() -> dict:
+    """Settings are fixed for the process lifetime; mode='json' turns Paths into strings once."""
+    return ProjectConfig.model_dump(mode='json')
+
+@st.cache_data(ttl=30, show_spinner=False)
+def check_system_health() -> dict:
+    """Ollama reachability (0.5 s probe, a dead daemon can't hang the page) and CUDA availability."""
+    health = {"ollama": False, "models": [], "cuda": None}
+    try:
+        response = httpx.get(f"{ProjectConfig.OLLAMA_URL}/api/tags", timeout=0.5)
+        response.raise_for_status()
+        health["ollama"] = True
+        health["models"] = [m.get("name", "") for m in response.json().get("models", [])]
+    except Exception as e:
+        logger.warning(f"Ollama health probe failed: {e}", extra={"tags": "HEALTH"})
+    try:
+        import torch  # heavy; imported only here and cached with the result
+        health["cuda"] = torch.cuda.get_device_name(0) if torch.cuda.is_available() else ""
+    except ImportError:
+        pass
+    return health
+
+@st.cache_data(ttl=10, show_spinner=False)
+def count_vault_notes(vault: str) -> int:
+    """Number of notes in the vault; unchanged directories are answered from fs.count_md_files' mtime cache."""
+    return count_md_files(vault)
+
+@st.fragment(run_every=1.0)
+def render_refinery_jobs():
+    """Polls notes queued with the Generate button."""
+    jobs = st.session_state.get("refinery_jobs")
+    if not jobs:
+        return
+    finished = [name for name, future in jobs.items() if future.done()]
+    for name in finished:
+        future = jobs.pop(name)
+        try:
+            st.toast(f"Utworzono notatkę: {future.result().name}", icon="✅")
+        except Exception as e:
+            st.error(f"Błąd Rafinerii ({name}): {e}")
+            logger.error(f"Refinery Error: {e}")
+    if jobs:
+        st.info("⏳ W kolejce Rafinerii: " + ", ".join(jobs))
+    if finished:
+        clear_inbox_cache()
+        # Full rerun so the inbox list and counter drop the archived files
+        st.rerun()
+
+@st.fragment
+def render_inbox_picker():
+    """Refinery file picker + preview; changing the selection reruns only this block, not the page."""
+    names, file_options, titles = inbox_display_options(_inbox_signature())
+    if not names:  # emptied since the page was drawn
+        st.info("Inbox jest pusty.")
+        return
     
-    style_map = {
-        "Akademicki": "Academic",
-        "Blog Post": "Blog Post",
-        "Wypunktowanie": "Bullet Points",
-        "Podsumowanie": "Summary"
-    }
-    selected_style = style_map.get(style, "Academic")
-
-    # 1. Generate Content (LLM)
-    processor = TranscriptProcessor()
-    note_content = processor.generate_note_content_from_text(
-        text=data.get('content', ''), 
-        meta=data.get('meta', {}),
-        style=selected_style
-    )
+    col_sel, col_act = st.columns([3, 1])
+    with col_sel:
+        selected_file_name = st.selectbox(
+            "Wybierz element z Inbox:", 
+            options=names,
+            format_func=lambda x: f"📄 {titles.get(x, x)}"
+        )
+    
+    selected_path = Path(file_options[selected_file_name])
+    summary = get_file_header(selected_path)
+    preview = get_file_preview(selected_path)
+
+    with col_act:
+        st.write("") 
+        st.write("") 
+        if st.button("🗑️ Usuń plik", type="secondary", use_container_width=True):
+            try:
+                inbox.delete(selected_path)
+                st.toast(f"Usunięto plik: {selected_path.name}")
+                time.sleep(1)
+                st.rerun()
+            except Exception as e:
+                st.error(f"Nie udało się usunąć: {e}")
+
+    if preview is not None:
+        st.divider()
+        c1, c2 = st.columns([1, 1])
+        with c1:
+            st.subheader(summary.title)
+            st.caption(f"Przetworzono: {summary.date}")
+            audio = audio_source(Path(summary.audio)) if summary.audio else None
+            if isinstance(audio, str):
+                # st.audio treats scheme-less strings as local files, the static URL goes into a plain <audio> tag
+                st.markdown(f'<audio controls preload="metadata" src="{audio}" style="width: 100%"></audio>', unsafe_allow_html=True)
+            elif audio is not None:
+                st.audio(audio)
+            st.text_area("Surowy Transkrypt (Podgląd)", preview+"...", height=400, disabled=True)
+        
+        with c2:
+            st.markdown("### Konfiguracja AI")
+            prompt_style = st.selectbox("Styl Notatki", list(_STYLE_MAP))
+            
+            if st.button("🧠 Generuj Notatkę Obsidian", type="primary", use_container_width=True):
+                jobs = st.session_state.setdefault("refinery_jobs", {})
+                if selected_path.name in jobs:
+                    st.warning("Ta notatka jest już generowana.")
+                else:
+                    # Runs on the shared pool; the page stays usable and render_refinery_jobs reports the result
+                    jobs[selected_path.name] = get_refinery_pool().submit(
+                        process_single_file, selected_path, selected_style=_STYLE_MAP.get(prompt_style, "Academic")
+                    )
+                    st.rerun()
+
+@st.fragment
+def render_chat(rag):
+    """RAG chat history, input and streaming answer; reruns without the sidebar and the rest of the page."""
+    messages = st.session_state.messages
+    split = max(0, len(messages) - CHAT_VISIBLE_MESSAGES)
+    if split:
+        with st.expander(f"Wcześniejsze ({split})"):
+            # One markdown element instead of `split` chat bubbles to lay out on every rerun
+            st.markdown("\n\n---\n\n".join(
+                f"**{CHAT_ROLE_LABELS.get(m['role'], m['role'])}:** {m['content']}"
+                for m in itertools.islice(messages, split)
+            ))
+    for message in itertools.islice(messages, split, None):
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    if prompt := st.chat_input("O co chcesz zapytać swojego Drugiego Mózgu?"):
+        append_chat_message({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        with st.chat_message("assistant"):
+            try:
+                # Last HISTORY_TURNS turns before the just-added question
+                end = len(st.session_state.messages) - 1
+                history = list(itertools.islice(st.session_state.messages, max(0, end - 2 * HISTORY_TURNS), end))
+                # [UX] Unpacking stream (async generator) and sources
+                stream, sources = rag.query(
+                    question=prompt, 
+                    history=history,
+                    n_results=5,
+                    stream=True
+                )
+                
+                # Display Sources with Obsidian URI
+                if sources:
+                    st.markdown("### 📚 Źródła:")
+                    # Vault folder name doubles as the Obsidian vault name; both parts fully URL-encoded
+                    vault_name = quote(ProjectConfig.OBSIDIAN_VAULT.name or "Obsidian Vault", safe="")
+                    st.markdown(" | ".join(
+                        f"[{src}](obsidian://open?vault={vault_name}&file={quote(src, safe='')})" for src in sources
+                    ))
+                    st.divider()
+
+                # Re-render at most ~20x/s; every update is a websocket round-trip
+                full_response = st.write_stream(format_think_tags(throttle_stream(iter_async(stream))))
+                append_chat_message({"role": "assistant", "content": full_response})
+                
+            except Exception as e:
+                st.error(f"Błąd generowania: {e}")
+
+def payload_hash(text: str, meta: dict) -> str:
+    """Content key for note memoization (blake2b: fast, stdlib, no extra dependency)."""
+    h = hashlib.blake2b(text.encode("utf-8"), digest_size=16)
+    h.update(orjson.dumps(meta, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS))
+    return h.hexdigest()
+
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+def generate_note_cached(content_hash: str, style: str, _text: str, _meta: dict) -> dict:
+    """
+    LLM note for one transcript version; repeated Generate clicks return instantly.
+    Only the hash and style key the cache (underscore args are not hashed by Streamlit).
+    A failed generation raises, and Streamlit does not memoize raised calls, so the next click retries.
+    """
+    return get_processor().generate_note_content_from_text(text=_text, meta=_meta, style=style)
+
+def process_single_file(file_path: Path, selected_style="Academic", gardener_instance=None, archive_dir: Optional[Path] = None):
+    """
+    Logic extracted for batch processing. `selected_style` is the processor's key (see _STYLE_MAP);
+    batch callers may pass their own `archive_dir`.
+    """
+    summary = get_file_header(file_path)
+    data = get_file_payload(file_path)
+    if not data: return False
+
+    # 1. Generate Content (LLM), memoized per transcript + metadata + style
+    text, meta = data.get('content', ''), data.get('meta', {})
+    note_content = generate_note_cached(payload_hash(text, meta), selected_style, text, meta)
     
     # 2. Smart Linking & Tagging (FlashText)
-    gardener = gardener_instance or ObsidianGardener()
-    final_note = gardener.auto_link(note_content['content'])
-    final_tags = gardener.smart_tagging(note_content.get('tags', []))
+    gardener = gardener_instance or get_gardener()
+    final_note, final_tags, _ = gardener.apply(note_content['content'], note_content.get('tags', []))
     
     # 3. Save to Vault
     saved_path = gardener.save_note(
-        title=note_content.get('title', summary['title']),
+        title=note_content.get('title', summary.title),
         content=final_note,
         tags=final_tags
     )
     
     # 4. Archive Inbox Item
-    archive_dir = ProjectConfig.INBOX_DIR / "archive"
-    archive_dir.mkdir(exist_ok=True)
-    file_path.rename(archive_dir / file_path.name)
+    # Callers clear the inbox listing cache (this may run on a batch worker thread)
+    inbox.archive(file_path, archive_dir or ProjectConfig.INBOX_DIR / "archive")
     
     return saved_path
 
-# --- SIDEBAR ---
-with st.sidebar:
-    st.title("⚡ AI Second Brain")
-    st.caption("v4.1 • UX Enhanced")
-    
-    # Navigation
-    st.markdown("### 🧭 Nawigacja")
-    selected_page = st.radio(
-        "Idź do:",
-        [
-            "📥 Pobieranie (Ingest)", 
-            "🏭 Przetwarzanie (Refinery)",
-            "🔎 Baza Wiedzy (RAG)",
-            "📰 Research & News",
-            "⚙️ System"
-        ],
-        label_visibility="collapsed",
-        key="main_nav"
-    )
-    
-    st.divider()
-    
-    # Inbox Status
-    inbox_files = load_inbox_items()
-    st.markdown("### 📊 Stan Kolejki")
-    col_met, col_ref = st.columns([2, 1])
-    with col_met:
-        st.metric("Inbox", len(inbox_files))
-    with col_ref:
-        st.write("") # wyrównanie do linii metryki
-        if st.button("🔄", help="Odśwież listę plików"):
-            st.rerun()
-    
-    if len(inbox_files) > 0:
-        st.info(f"Najnowszy: {inbox_files[0].name[:20]}...")
-    
-    # [UX] Live Logs
-    with st.expander("🤖 Status BrainGuard", expanded=False):
-        log_file = Path("brain_guard.log")
-        if log_file.exists():
-            # Czytamy ostatnie linie
-            lines = log_file.read_text(encoding='utf-8').splitlines()[-10:]
-            st.code("\n".join(lines), language="bash")
-            if st.button("Odśwież log"):
-                st.rerun()
-        else:
-            st.warning("Brak pliku logów.")
-
-    st.divider()
-    st.info("System optymalizuje użycie VRAM poprzez oddzielenie pobierania (Whisper) od przetwarzania (LLM).")
-
 # ==============================================================================
 # PAGE 1: INGEST (Extract)
 # ==============================================================================
-if selected_page == "📥 Pobieranie (Ingest)":
+def render_ingest_page():
     st.header("1. Pobieranie Mediów")
     st.caption("Pobierz audio z YouTube lub pliku, wykonaj transkrypcję i zapisz do Inbox.")
+    render_ingest_progress()
     
     col1, col2 = st.columns([1, 2])
     with col1:
@@ -176,78 +644,63 @@ if selected_page == "📥 Pobieranie (Ingest)":
             uploaded_file = None
         else:
             video_url = None
-            uploaded_file = st.file_uploader("Wrzuć nagranie", type=['mp3', 'wav', 'm4a', 'ogg'])
+            uploaded_file = st.file_uploader("Wrzuć nagranie", type=list(AUDIO_EXTENSIONS))
 
     st.divider()
 
+    if source_type != "YouTube URL":
+        local_audio = load_local_audio(_dir_signature(ProjectConfig.TEMP_DIR))
+        if local_audio and st.button(f"📂 Transkrybuj cały katalog lokalny ({len(local_audio)} plików)", use_container_width=True):
+            status = st.status("Transkrypcja wsadowa...", expanded=True)
+            try:
+                transcriber = get_transcriber(model_size)
+                saved = transcriber.batch_to_inbox(list(local_audio), progress_callback=lambda msg: status.write(f"🔄 {msg}"))
+                # Transcribed sources leave TEMP_DIR so the next batch does not repeat them
+                done_dir = ProjectConfig.TEMP_DIR / "transcribed"
+                done_dir.mkdir(exist_ok=True)
+                for audio_path in saved:
+                    os.replace(audio_path, done_dir / Path(audio_path).name)
+                clear_inbox_cache()
+                status.update(label=f"✅ Zapisano {len(saved)}/{len(local_audio)} plików w Inbox.", state="complete")
+            except Exception as e:
+                status.update(label="❌ Błąd Krytyczny", state="error")
+                st.error(str(e))
+                logger.error(f"Batch Ingest Error: {e}")
+
     if st.button("🚀 Rozpocznij Proces", type="primary", use_container_width=True):
         if source_type == "YouTube URL":
             if not video_url:
                 st.error("Podaj URL!")
                 st.stop()
 
-            status = st.status("Inicjalizacja potoku...", expanded=True)
-            progress = status.empty()
-            
-            try:
-                transcriber = VideoTranscriber(model_size=model_size)
-                def update_progress(msg): status.write(f"🔄 {msg}")
-                json_path = transcriber.process_to_inbox(video_url, progress_callback=update_progress)
-                status.update(label="✅ Zakończono!", state="complete", expanded=False)
-                st.success(f"Zapisano dane w Inbox: `{Path(json_path).name}`")
-                st.balloons()
-                time.sleep(2)
+            if "ingest_job" in st.session_state:
+                st.warning("Poprzednie pobieranie jeszcze trwa.")
+            else:
+                # Runs in a separate process; the page stays responsive and polls progress below
+                worker = _lazy("utils.ingest_worker")
+                st.session_state.ingest_job = worker.IngestJob(worker.run_youtube_ingest, video_url, model_size)
                 st.rerun()
-            except Exception as e:
-                status.update(label="❌ Błąd Krytyczny", state="error")
-                st.error(str(e))
-                logger.error(f"Ingest Error: {e}")
         else:
             if not uploaded_file:
                 st.error("Wybierz plik!")
                 st.stop()
-            status = st.status("Przetwarzanie pliku lokalnego...", expanded=True)
+            if "ingest_job" in st.session_state:
+                st.warning("Poprzednia transkrypcja jeszcze trwa.")
+                st.stop()
             save_path = ProjectConfig.TEMP_DIR / uploaded_file.name
-            with open(save_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            try:
-                status.write("🎧 Inicjalizacja Whisper...")
-                transcriber = VideoTranscriber(model_size=model_size)
-                meta = {
-                    "id": f"local-{int(time.time())}",
-                    "title": uploaded_file.name,
-                    "uploader": "Marcin (Voice Memo)",
-                    "duration": 0,
-                    "local_path": str(save_path),
-                    "url": "local_file"
-                }
-                status.write("🎧 Transkrypcja (Whisper)...")
-                transcript_data = transcriber._run_transcription_isolated(str(save_path))
-                payload = {
-                    "meta": meta,
-                    "content": transcript_data['text'],
-                    "segments": transcript_data['segments'],
-                    "processed_at": time.time(),
-                    "status": "ready_for_refinery"
-                }
-                out_name = f"memo-{int(time.time())}.json"
-                out_path = ProjectConfig.INBOX_DIR / out_name
-                with open(out_path, 'w', encoding='utf-8') as f:
-                    json.dump(payload, f, indent=2, ensure_ascii=False)
-                status.update(label="✅ Gotowe! Plik w Inbox.", state="complete")
-                st.success(f"Zapisano dane w Inbox: `{out_name}`")
-                st.balloons()
-                time.sleep(2)
-                st.rerun()
-            except Exception as e:
-                status.update(label="❌ Błąd Krytyczny", state="error")
-                st.error(f"Błąd: {e}")
+            uploaded_file.seek(0)
+            save_stream(uploaded_file, save_path, size=uploaded_file.size)
+            # Whisper runs in its own process, so all of its VRAM is returned before the Refinery loads an LLM
+            worker = _lazy("utils.ingest_worker")
+            st.session_state.ingest_job = worker.IngestJob(worker.run_upload_ingest, str(save_path), uploaded_file.name, model_size)
+            st.rerun()
 
 # ==============================================================================
 # PAGE 2: REFINERY (Transform & Load)
 # ==============================================================================
-elif selected_page == "🏭 Przetwarzanie (Refinery)":
+def render_refinery_page():
     st.header("2. Rafineria Wiedzy")
+    render_refinery_jobs()
     
     if not inbox_files:
         st.info("Inbox jest pusty. Przejdź do zakładki Pobieranie, aby dodać materiały.")
@@ -257,17 +710,28 @@ elif selected_page == "🏭 Przetwarzanie (Refinery)":
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            # Initialize gardener once for the whole batch
-            batch_gardener = ObsidianGardener()
+            # Shared cached gardener for the whole batch
+            batch_gardener = get_gardener()
+            
+            archive_dir = ProjectConfig.INBOX_DIR / "archive"
             
-            for i, file_path in enumerate(inbox_files):
-                status_text.text(f"Przetwarzanie: {file_path.name}...")
+            pool = get_refinery_pool()
+            queued = st.session_state.get("refinery_jobs", {})
+            # Batch notes have always come out in the Academic style (the old label lookup fell back to it)
+            futures = {
+                pool.submit(process_single_file, file_path, "Academic", batch_gardener, archive_dir): file_path
+                for file_path in map(Path, inbox_files) if file_path.name not in queued
+            }
+            # UI updates stay on the script thread
+            for done, future in enumerate(as_completed(futures), start=1):
+                file_path = futures[future]
                 try:
-                    process_single_file(file_path, style="Summary", gardener_instance=batch_gardener)
+                    future.result()
+                    status_text.text(f"Przetworzono: {file_path.name}")
                 except Exception as e:
                     st.error(f"Błąd przy {file_path.name}: {e}")
-                
-                progress_bar.progress((i + 1) / len(inbox_files))
+                progress_bar.progress(done / len(futures))
+            clear_inbox_cache()
             
             st.success("Kolejka przetworzona!")
             st.balloons()
@@ -277,73 +741,19 @@ elif selected_page == "🏭 Przetwarzanie (Refinery)":
         st.divider()
 
         # Single Selection Logic
-        file_options = {f.name: f for f in inbox_files}
-        
-        col_sel, col_act = st.columns([3, 1])
-        with col_sel:
-            selected_file_name = st.selectbox(
-                "Wybierz element z Inbox:", 
-                options=list(file_options.keys()),
-                format_func=lambda x: f"📄 {x}"
-            )
-        
-        selected_path = file_options[selected_file_name]
-        summary = get_file_summary(selected_path)
-        data = summary['data']
-
-        with col_act:
-            st.write("") 
-            st.write("") 
-            if st.button("🗑️ Usuń plik", type="secondary", use_container_width=True):
-                try:
-                    selected_path.unlink()
-                    st.toast(f"Usunięto plik: {selected_path.name}")
-                    time.sleep(1)
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Nie udało się usunąć: {e}")
-
-        if data:
-            st.divider()
-            c1, c2 = st.columns([1, 1])
-            with c1:
-                st.subheader(summary['title'])
-                st.caption(f"Przetworzono: {summary['date']}")
-                st.text_area("Surowy Transkrypt (Podgląd)", data.get('content', '')[:1000]+"...", height=400, disabled=True)
-            
-            with c2:
-                st.markdown("### Konfiguracja AI")
-                prompt_style = st.selectbox("Styl Notatki", ["Akademicki", "Blog Post", "Wypunktowanie", "Podsumowanie"])
-                
-                if st.button("🧠 Generuj Notatkę Obsidian", type="primary", use_container_width=True):
-                    with st.spinner("Ładowanie LLM i Generowanie..."):
-                        try:
-                            saved_path = process_single_file(selected_path, style=prompt_style)
-                            st.success(f"Utworzono notatkę: `{saved_path.name}`")
-                            st.balloons()
-                            time.sleep(2)
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Błąd Rafinerii: {e}")
-                            logger.error(f"Refinery Error: {e}")
+        render_inbox_picker()
 
 # ==============================================================================
 # PAGE 3: RAG (Knowledge Base Chat)
 # ==============================================================================
-elif selected_page == "🔎 Baza Wiedzy (RAG)":
+def render_rag_page():
     st.header("🔎 Czat z Bazą Wiedzy (RAG)")
     
-    if "rag_engine" not in st.session_state:
-        try:
-            from rag_engine import ObsidianRAG
-            with st.spinner("Ładowanie silnika wektorowego (ChromaDB)..."):
-                st.session_state.rag_engine = ObsidianRAG()
-                st.toast("Silnik RAG załadowany pomyślnie.")
-        except Exception as e:
-            st.error(f"Nie udało się załadować RAG: {e}")
-            st.stop()
-
-    rag = st.session_state.rag_engine
+    try:
+        rag = get_rag()
+    except Exception as e:
+        st.error(f"Nie udało się załadować RAG: {e}")
+        st.stop()
 
     col_idx, col_clear = st.columns([3, 1])
     with col_idx:
@@ -351,79 +761,35 @@ elif selected_page == "🔎 Baza Wiedzy (RAG)":
             st.caption("Uruchom, gdy dodasz nowe notatki do Obsidiana.")
             if st.button("🔄 Przeindeksuj Skarbiec (Incremental)"):
                 with st.spinner("Aktualizacja wektorów..."):
-                    added = rag.index_vault(ProjectConfig.OBSIDIAN_VAULT)
+                    bar = st.progress(0.0)
+                    added = rag.index_vault(ProjectConfig.OBSIDIAN_VAULT, progress_callback=lambda done, total: bar.progress(done / total))
                     st.success(f"Zindeksowano nowych fragmentów: {added}")
     
     with col_clear:
         st.write("") 
         if st.button("🧹 Wyczyść Czat", type="secondary"):
-            st.session_state.messages = []
-            st.rerun()
+            # Cleared before render_chat runs below, no extra rerun needed
+            st.session_state.messages = deque(maxlen=CHAT_HISTORY_MAXLEN)
+            ProjectConfig.CHAT_HISTORY_FILE.unlink(missing_ok=True)
 
     st.divider()
 
     if "messages" not in st.session_state:
-        st.session_state.messages = []
-
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+        st.session_state.messages = load_chat_history()
 
-    if prompt := st.chat_input("O co chcesz zapytać swojego Drugiego Mózgu?"):
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-
-        with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            full_response = ""
-            
-            try:
-                # [UX] Unpacking stream and sources
-                stream, sources = rag.query(
-                    question=prompt, 
-                    history=st.session_state.messages[:-1],
-                    n_results=5,
-                    stream=True
-                )
-                
-                # Display Sources with Obsidian URI
-                if sources:
-                    st.markdown("### 📚 Źródła:")
-                    source_links = []
-                    for src in sources:
-                        # Assuming 'Obsidian Vault' is the vault name from config or general
-                        # Ideally we read the folder name from ProjectConfig.OBSIDIAN_VAULT.name
-                        vault_name = ProjectConfig.OBSIDIAN_VAULT.name or "Obsidian Vault"
-                        link = f"obsidian://open?vault={vault_name}&file={src.replace(' ', '%20')}"
-                        source_links.append(f"[{src}]({link})")
-                    
-                    st.markdown(" | ".join(source_links))
-                    st.divider()
-
-                for chunk in stream:
-                    content = chunk.get('message', {}).get('content', '')
-                    full_response += content
-                    message_placeholder.markdown(full_response + "▌")
-                
-                message_placeholder.markdown(full_response)
-                st.session_state.messages.append({"role": "assistant", "content": full_response})
-                
-            except Exception as e:
-                st.error(f"Błąd generowania: {e}")
+    render_chat(rag)
 
 # ==============================================================================
 # PAGE 4 & 5
 # ==============================================================================
-elif selected_page == "📰 Research & News":
+def render_research_page():
     st.header("📰 Agent Newsowy i Research")
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Daily Cybersec Briefing")
         st.caption("Pobiera newsy z zdefiniowanych kanałów RSS.")
         if st.button("Uruchom NewsAgenta"):
-            from news_agent import NewsAgent
-            agent = NewsAgent()
+            agent = get_news_agent()
             with st.status("Analiza RSS...", expanded=True) as status:
                 count = agent.run(limit=3) 
                 status.update(label=f"Zakończono! Dodano {count} nowych notatek.", state="complete")
@@ -432,13 +798,83 @@ elif selected_page == "📰 Research & News":
         target_url = st.text_input("Wklej link do artykułu/dokumentacji:")
         if st.button("Analizuj Artykuł"):
             if target_url:
-                from ai_research import WebResearcher
-                researcher = WebResearcher()
+                researcher = get_researcher()
                 with st.spinner("Pobieranie i analiza AI..."):
                     success = researcher.process_url(target_url)
                     if success: st.success("Notatka badawcza utworzona w folderze Research!")
                     else: st.error("Błąd pobierania.")
 
-elif selected_page == "⚙️ System":
+def render_system_page():
     st.header("⚙️ Konfiguracja Systemu")
-    st.json(ProjectConfig.model_dump())
\ No newline at end of file
+    health = check_system_health()
+    notes = count_vault_notes(str(ProjectConfig.OBSIDIAN_VAULT))
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Ollama", "🟢 Online" if health["ollama"] else "🔴 Offline", f"{len(health['models'])} modeli" if health["ollama"] else None)
+    c2.metric("GPU (CUDA)", health["cuda"] or "Brak")
+    c3.metric("Notatki w Skarbcu", notes)
+    if health["ollama"] and not any(ProjectConfig.OLLAMA_MODEL in m for m in health["models"]):
+        st.warning(f"Model {ProjectConfig.OLLAMA_MODEL} nie jest pobrany w Ollama.")
+    st.json(config_dump())
+
+# Sidebar label -> page renderer; only the selected page runs
+PAGES: Final[Mapping[str, Callable[[], None]]] = MappingProxyType({
+    "📥 Pobieranie (Ingest)": render_ingest_page,
+    "🏭 Przetwarzanie (Refinery)": render_refinery_page,
+    "🔎 Baza Wiedzy (RAG)": render_rag_page,
+    "📰 Research & News": render_research_page,
+    "⚙️ System": render_system_page,
+})
+
+if ProjectConfig.OLLAMA_WARMUP:
+    start_ollama_warmup()
+
+# --- SIDEBAR ---
+with st.sidebar:
+    st.title("⚡ AI Second Brain")
+    st.caption("v4.1 • UX Enhanced")
+    
+    # Navigation
+    st.markdown("### 🧭 Nawigacja")
+    selected_page = st.radio(
+        "Idź do:",
+        list(PAGES),
+        label_visibility="collapsed",
+        key="main_nav"
+    )
+    
+    st.divider()
+    
+    # Inbox Status
+    inbox_files = load_inbox_items(_inbox_signature())
+    st.markdown("### 📊 Stan Kolejki")
+    col_met, col_ref = st.columns([2, 1])
+    with col_met:
+        st.metric("Inbox", len(inbox_files))
+    with col_ref:
+        st.write("") # wyrównanie do linii metryki
+        if st.button("🔄", help="Odśwież listę plików"):
+            clear_inbox_cache()
+            st.rerun()
+    
+    if len(inbox_files) > 0:
+        st.info(f"Najnowszy: {os.path.basename(inbox_files[0])[:20]}...")
+    
+    # [UX] Live Logs
+    with st.expander("🤖 Status BrainGuard", expanded=False):
+        render_log_tail()
+
+    if st.button("♻️ Przeładuj indeks linków", help="Po ręcznych zmianach w Skarbcu (nowe/zmienione nazwy notatek)"):
+        with st.spinner("Indeksowanie notatek do auto-linkowania..."):
+            get_gardener().refresh()
+        st.toast("Indeks linków odbudowany.")
+
+    if ProjectConfig.WHISPER_KEEP_LOADED and st.button("🧹 Zwolnij modele Whisper", help="Modele trzymane w VRAM między transkrypcjami"):
+        # Only if something was transcribed in this process (don't import torch just to unload nothing)
+        if "video_transcriber" in sys.modules:
+            sys.modules["video_transcriber"].unload_models()
+        st.toast("Zwolniono pamięć VRAM.")
+
+    st.divider()
+    st.info("System optymalizuje użycie VRAM poprzez oddzielenie pobierania (Whisper) od przetwarzania (LLM).")
+
+PAGES[selected_page]()
@@ -1,7 +1,7 @@
 import time
-import json
-import shutil
+import asyncio
 import logging
+import threading
 import sys
 import os
 import re
@@ -9,17 +9,20 @@ import re
 # Ensure project root is in sys.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-import ollama
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
-from watchdog.observers.polling import PollingObserver as Observer
+from typing import List, Optional, Tuple
+from watchdog.observers.polling import PollingObserver
 from watchdog.events import FileSystemEventHandler
 
 from config import ProjectConfig
-from video_transcriber import VideoTranscriber
+from video_transcriber import create_transcriber
 from ai_research import WebResearcher
 from ai_notes import TranscriptProcessor
 from obsidian_manager import ObsidianGardener
+from utils.fs import move_file, wait_stable
+from utils.ollama_client import get_client, preload, set_keep_alive
 from utils.life_admin import process_voice_note_for_life
 from pdf_shredder import PDFShredder
 
@@ -44,17 +47,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger("BrainGuard")
 
+# Audio arriving within this many seconds of the first file is transcribed as one batch (one model load)
+AUDIO_BATCH_WINDOW = 3.0
+
 class BrainGuardHandler(FileSystemEventHandler):
     """
     Watches the '00_Inbox' folder for new media files.
     Triggers the ETL pipeline: Transcribe -> Summarize -> Save -> Log.
     """
     def __init__(self):
-        self.transcriber = VideoTranscriber(model_size="medium") # Use medium for better accuracy
+        self.transcriber = create_transcriber(model_size="medium") # Use medium for better accuracy
         self.processor = TranscriptProcessor()
         self.gardener = ObsidianGardener()
         self.researcher = WebResearcher(gardener=self.gardener)
-        self.shredder = PDFShredder(vault_path=str(ProjectConfig.OBSIDIAN_VAULT))
+        self.shredder = PDFShredder(vault_path=str(ProjectConfig.OBSIDIAN_VAULT), gardener=self.gardener)
         
         self.supported_extensions = {
             # Audio/Video
@@ -69,6 +75,20 @@ class BrainGuardHandler(FileSystemEventHandler):
         self.queue_filename = "youtube_queue.md"
         self.article_queue_filename = "reading_list.md"
         self.processing_queue = False
+        # inotify reports when the writer closes the file, so media needs no stability probe
+        self.close_events = ProjectConfig.WATCHER_BACKEND == "inotify"
+
+        # Note generation and task extraction for one transcript run side by side
+        self._llm_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm")
+
+        # Audio/video files wait here for the batch worker
+        self._audio_queue = deque()
+        self._audio_ready = threading.Event()
+        threading.Thread(target=self._audio_worker, name="audio-batch", daemon=True).start()
+        # BrainGuard's Ollama calls keep their model loaded for OLLAMA_KEEP_ALIVE (sparse events skip the reload).
+        # Only the fast model is warmed up front: pinning both before any work would leave Whisper little VRAM
+        set_keep_alive(ProjectConfig.OLLAMA_KEEP_ALIVE)
+        preload(ProjectConfig.OLLAMA_MODEL_FAST)
         logger.info("BrainGuard initialized and ready to protect (Media + Notes + Docs + Images).")
 
     def _extract_tasks(self, text: str) -> list[str]:
@@ -105,6 +125,15 @@ class BrainGuardHandler(FileSystemEventHandler):
             logger.error(f"Task extraction failed: {e}")
             return []
 
+    def _note_and_tasks(self, raw_text: str, meta: dict) -> Tuple[dict, List[str]]:
+        """
+        Summary (OLLAMA_MODEL) and Life Admin tasks (OLLAMA_MODEL_FAST) are independent LLM calls:
+        run them concurrently, so the transcript costs the longer of the two, not their sum.
+        """
+        tasks_future = self._llm_pool.submit(self._extract_tasks, raw_text)
+        note_data = self.processor.generate_note_content_from_text(raw_text, meta=meta)
+        return note_data, tasks_future.result()
+
     def on_created(self, event):
         if event.is_directory:
             return
@@ -127,15 +156,44 @@ class BrainGuardHandler(FileSystemEventHandler):
             return
 
         if file_path.suffix.lower() in self.supported_extensions:
+            if self.close_events and file_path.suffix.lower() != '.md':
+                return  # handled by on_closed once the copy is complete
             logger.info(f"detected new file: {file_path}")
             # Wait for file to be fully written (important for MD files)
-            time.sleep(1)
+            if not wait_stable(file_path):
+                logger.warning(f"File vanished or never settled: {file_path.name}")
+                return
             
             if file_path.suffix.lower() == '.md':
                 self.process_markdown_file(file_path)
             else:
                 self.process_file(file_path)
 
+    def _is_new_media(self, file_path: Path) -> bool:
+        """Audio/video, PDF or image (not notes or queues), ignoring temp and hidden files."""
+        if file_path.name.startswith('.') or file_path.suffix == '.tmp':
+            return False
+        ext = file_path.suffix.lower()
+        return ext in self.supported_extensions and ext != '.md'
+
+    def on_closed(self, event):
+        """inotify backend (IN_CLOSE_WRITE): the file is complete, process it right away."""
+        if event.is_directory or not self.close_events:
+            return
+        file_path = Path(event.src_path)
+        if self._is_new_media(file_path):
+            logger.info(f"detected new file: {file_path}")
+            self.process_file(file_path)
+
+    def on_moved(self, event):
+        """A file renamed inside the inbox (e.g. a finished browser download) is already complete."""
+        if event.is_directory:
+            return
+        dest = Path(event.dest_path)
+        if dest.parent == Path(event.src_path).parent and self._is_new_media(dest):
+            logger.info(f"detected renamed file: {dest}")
+            self.process_file(dest)
+
     def on_modified(self, event):
         if event.is_directory: return
         file_path = Path(event.src_path)
@@ -218,6 +276,8 @@ class BrainGuardHandler(FileSystemEventHandler):
                 lines = f.readlines()
             
             # Identify work
+            jobs = []
+            changed = False
             for i, line in enumerate(lines):
                 line_stripped = line.strip()
                 
@@ -226,73 +286,98 @@ class BrainGuardHandler(FileSystemEventHandler):
                    "✅" not in line_stripped and \
                    "⏳" not in line_stripped and \
                    "❌" not in line_stripped:
-                         
-                    # 1. Mark as In Progress immediately
-                    lines[i] = line.rstrip() + " ⏳ [W trakcie...]\n"
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.writelines(lines)
                     
                     # Extract URL
                     url_match = re.search(r'(https?://(?:www\.|m\.)?(?:youtube\.com/(?:watch\?v=|live/|embed/)|youtu\.be/)([\w-]+))', line_stripped)
+                    changed = True
                     if not url_match:
                         lines[i] = line.rstrip() + " ❌ [Błąd: Niepoprawny URL]\n"
-                        with open(file_path, 'w', encoding='utf-8') as f:
-                            f.writelines(lines)
                         continue
-
-                    full_url = url_match.group(0)
-                    logger.info(f"Queue processing: {full_url}")
-
-                    try:
-                        # PROCESS
-                        # 1. Transcribe (Download -> Inbox JSON)
-                        json_path = self.transcriber.process_to_inbox(full_url)
-                        
-                        # 2. Read JSON payload
-                        with open(json_path, 'r', encoding='utf-8') as jf:
-                            payload = json.load(jf)
-                        
-                        # 3. Generate Note Content
-                        note_data = self.processor.generate_note_content_from_text(
-                            payload['content'], 
-                            meta=payload['meta']
-                        )
-                        
-                        # 4. Save to Vault (Smart Categorize)
-                        category = self.gardener.smart_categorize(note_data['content'])
-                        target_dir = ProjectConfig.OBSIDIAN_VAULT / category
-                        target_dir.mkdir(parents=True, exist_ok=True)
-                        target_path = target_dir / f"{note_data['title']}.md"
-                        
-                        with open(target_path, 'w', encoding='utf-8') as nf:
-                            nf.write(note_data['content'])
-                            
-                        # 5. Update Daily Log
-                        self.gardener.update_daily_log(
-                            title=note_data['title'],
-                            summary=note_data['summary'],
-                            tasks=[],
-                            note_path=str(target_path)
-                        )
-
-                        # Mark Done
-                        lines[i] = line.rstrip() + " ✅ [Gotowe]\n"
-                        logger.info(f"Queue Task Completed: {full_url}")
-                        send_windows_notification("BrainGuard Queue", f"Przetworzono: {note_data['title']}")
-
-                    except Exception as e:
-                        logger.error(f"Queue Task Failed {full_url}: {e}")
-                        lines[i] = line.rstrip() + f" ❌ [Błąd: {str(e)[:50]}]\n"
                     
-                    # Write update after processing this item
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.writelines(lines)
+                    # 1. Mark as In Progress immediately
+                    lines[i] = line.rstrip() + " ⏳ [W trakcie...]\n"
+                    jobs.append((i, line, url_match.group(0)))
+
+            if changed:
+                self._write_lines(file_path, lines)
+            if jobs:
+                asyncio.run(self._run_youtube_pipeline(file_path, lines, jobs))
 
         except Exception as e:
             logger.error(f"Error processing queue file: {e}")
         finally:
             self.processing_queue = False
 
+    @staticmethod
+    def _write_lines(file_path: Path, lines: List[str]):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+
+    async def _run_youtube_pipeline(self, file_path: Path, lines: List[str], jobs: List[Tuple[int, str, str]]):
+        """
+        Producer/consumer over the queue: the next video downloads (network) while the current one is
+        transcribed and refined. Whisper and the LLM stay sequential, they share the GPU's VRAM.
+        """
+        downloaded: asyncio.Queue = asyncio.Queue(maxsize=1)  # at most one video downloaded ahead
+
+        async def download():
+            for i, line, full_url in jobs:
+                logger.info(f"Queue processing: {full_url}")
+                try:
+                    meta = await asyncio.to_thread(self.transcriber.download_video, full_url)
+                except Exception as e:
+                    meta = e
+                await downloaded.put((i, line, full_url, meta))
+            await downloaded.put(None)
+
+        async def transcribe_and_refine():
+            while (item := await downloaded.get()) is not None:
+                i, line, full_url, meta = item
+                try:
+                    if isinstance(meta, Exception):
+                        raise meta
+                    title = await asyncio.to_thread(self._youtube_to_note, meta)
+                    # Mark Done
+                    lines[i] = line.rstrip() + " ✅ [Gotowe]\n"
+                    logger.info(f"Queue Task Completed: {full_url}")
+                    send_windows_notification("BrainGuard Queue", f"Przetworzono: {title}")
+                except Exception as e:
+                    logger.error(f"Queue Task Failed {full_url}: {e}")
+                    lines[i] = line.rstrip() + f" ❌ [Błąd: {str(e)[:50]}]\n"
+                # Write update after processing this item
+                await asyncio.to_thread(self._write_lines, file_path, lines)
+
+        await asyncio.gather(download(), transcribe_and_refine())
+
+    def _youtube_to_note(self, meta: dict) -> str:
+        """Downloaded video -> transcript payload -> note in the vault + daily log. Returns the note title."""
+        # 1. Transcribe (payload stays in memory; Inbox JSON only with PERSIST_TRANSCRIPT_JSON)
+        payload = self.transcriber.transcribe_payload(meta)
+        
+        # 2. Generate Note Content
+        note_data = self.processor.generate_note_content_from_text(
+            payload['content'], 
+            meta=payload['meta']
+        )
+        
+        # 3. Save to Vault (Smart Categorize)
+        category = self.gardener.smart_categorize(note_data['content'])
+        target_dir = ProjectConfig.OBSIDIAN_VAULT / category
+        target_dir.mkdir(parents=True, exist_ok=True)
+        target_path = target_dir / f"{note_data['title']}.md"
+        
+        with open(target_path, 'w', encoding='utf-8') as nf:
+            nf.write(note_data['content'])
+            
+        # 4. Update Daily Log
+        self.gardener.update_daily_log(
+            title=note_data['title'],
+            summary=note_data['summary'],
+            tasks=[],
+            note_path=str(target_path)
+        )
+        return note_data['title']
+
     def process_markdown_file(self, file_path: Path):
         """Processes a markdown file looking for audio attachments OR URLs."""
         # EXCEPTION: Do not refine queue files as regular notes!
@@ -335,17 +420,12 @@ class BrainGuardHandler(FileSystemEventHandler):
                 if audio_path:
                     logger.info(f"Processing attached audio: {audio_path}")
                     # 1. Transcribe
-                    json_path = self.transcriber.process_local_file(str(audio_path))
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        payload = json.load(f)
+                    payload = self.transcriber.process_local_file(str(audio_path))
                     
                     raw_text = payload['content']
                     
-                    # 2. Generate Note Snippet
-                    note_data = self.processor.generate_note_content_from_text(raw_text, meta={"title": audio_filename})
-                    
-                    # 3. Life Admin Extraction
-                    tasks = self._extract_tasks(raw_text)
+                    # 2-3. Generate Note Snippet + Life Admin Extraction (concurrently)
+                    note_data, tasks = self._note_and_tasks(raw_text, meta={"title": audio_filename})
                     life_section = ""
                     if tasks:
                         life_section = "\n### 🏠 Life Admin & Tasks\n" + "\n".join([f"- [ ] {t}" for t in tasks]) + "\n"
@@ -372,7 +452,7 @@ class BrainGuardHandler(FileSystemEventHandler):
                     
                     if target_dir != file_path.parent:
                         new_note_path = target_dir / file_path.name
-                        shutil.move(file_path, new_note_path)
+                        move_file(file_path, new_note_path)
                         logger.info(f"Categorized and moved MD file to: {new_note_path}")
                         # Update file_path for subsequent loops if needed (though we only process once per event generally)
                         file_path = new_note_path
@@ -382,7 +462,7 @@ class BrainGuardHandler(FileSystemEventHandler):
                     archive_dir.mkdir(parents=True, exist_ok=True)
                     
                     try:
-                        shutil.move(audio_path, archive_dir / audio_filename)
+                        move_file(audio_path, archive_dir / audio_filename)
                         logger.info(f"Archived audio file to: {archive_dir / audio_filename}")
                     except Exception as e:
                         logger.warning(f"Could not move audio file (may be in use): {e}")
@@ -401,10 +481,8 @@ class BrainGuardHandler(FileSystemEventHandler):
                 logger.info(f"Found YouTube URL: {full_url}")
                 
                 try:
-                    # 1. Transcribe (Download -> Inbox JSON)
-                    json_path = self.transcriber.process_to_inbox(full_url)
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        payload = json.load(f)
+                    # 1. Transcribe (Download -> payload in memory)
+                    payload = self.transcriber.transcribe_payload(self.transcriber.download_video(full_url))
                     
                     raw_text = payload['content']
                     meta = payload['meta']
@@ -433,12 +511,12 @@ class BrainGuardHandler(FileSystemEventHandler):
         """Refines a raw text note: Links -> Tags -> Categorizes -> Moves."""
         try:
             # 1. Auto-Link (FlashText) & Semantic Links
-            linked_content = self.gardener.auto_link(content)
-            linked_content = self.gardener.suggest_semantic_links(linked_content)
+            linked_content, linked_titles = self.gardener.optimizer.link_and_collect(content)
+            linked_content = self.gardener.suggest_semantic_links(linked_content, linked_titles)
             
             # 2. Generate Tags (LLM)
             prompt = f"Proszę wygenerować 3-5 tagów (słowa kluczowe) dla poniższego tekstu. Zwróć tylko listę po przecinku.\n\n{content[:2000]}"
-            response = ollama.chat(
+            response = get_client().chat(
                 model=ProjectConfig.OLLAMA_MODEL_FAST,
                 messages=[{'role': 'user', 'content': prompt}]
             )
@@ -504,7 +582,7 @@ class BrainGuardHandler(FileSystemEventHandler):
         
         try:
             target_path = archive_dir / file_path.name
-            shutil.move(file_path, target_path)
+            move_file(file_path, target_path)
             logger.info(f"Archived file to: {target_path}")
         except Exception as e:
             logger.warning(f"Could not archive file {file_path.name}: {e}")
@@ -514,9 +592,6 @@ class BrainGuardHandler(FileSystemEventHandler):
         Orchestrates the processing pipeline.
         """
         try:
-            # Wait a bit for file copy to finish
-            time.sleep(2) 
-            
             logger.info(f"Starting processing for: {file_path.name}")
             ext = file_path.suffix.lower()
 
@@ -541,64 +616,89 @@ class BrainGuardHandler(FileSystemEventHandler):
                 return
 
             # --- Audio/Video Handling ---
-            # 1. Transcribe
-            json_path = self.transcriber.process_local_file(str(file_path))
-            
-            # Load the transcript payload
-            with open(json_path, 'r', encoding='utf-8') as f:
-                payload = json.load(f)
-            
-            raw_text = payload['content']
-            meta = payload['meta']
+            # Transcribed by the batch worker together with anything else arriving in the window
+            self._audio_queue.append(file_path)
+            self._audio_ready.set()
 
-            if not raw_text:
-                logger.warning("Empty transcript generated.")
-                return
+        except Exception as e:
+            logger.error(f"Processing failed for {file_path}: {e}", exc_info=True)
 
-            # 2. Generate Note Content (Summary & Body)
-            note_data = self.processor.generate_note_content_from_text(raw_text, meta=meta)
-            
-            # 3. Extract Tasks (Life Admin)
-            tasks = self._extract_tasks(raw_text)
+    def _audio_worker(self):
+        """Collects audio for AUDIO_BATCH_WINDOW seconds after the first arrival, then transcribes it as one batch."""
+        while True:
+            self._audio_ready.wait()
+            time.sleep(AUDIO_BATCH_WINDOW)
+            self._audio_ready.clear()
+            batch = []
+            while self._audio_queue:
+                batch.append(self._audio_queue.popleft())
+            if batch:
+                self._process_audio_batch(batch)
+
+    def _process_audio_batch(self, paths: List[Path]):
+        """One Whisper load for the whole batch, then the per-file LLM/save steps."""
+        logger.info(f"Transcribing batch of {len(paths)} audio file(s)")
+        try:
+            payloads = self.transcriber.batch_to_payloads([str(p) for p in paths])
+        except Exception as e:
+            logger.error(f"Batch transcription failed: {e}", exc_info=True)
+            return
+        for file_path in paths:
+            payload = payloads.get(str(file_path))
+            if payload is None:
+                logger.error(f"Transcription failed for {file_path.name}")
+                continue
+            try:
+                self._audio_to_note(file_path, payload)
+            except Exception as e:
+                logger.error(f"Processing failed for {file_path}: {e}", exc_info=True)
 
-            # Append Life Admin section to content
-            if tasks:
-                life_section = "\n\n## 🏠 Life Admin & Tasks\n" + "\n".join([f"- [ ] {t}" for t in tasks])
-                note_data['content'] += life_section
+    def _audio_to_note(self, file_path: Path, payload: dict):
+        """Inbox payload of a transcribed recording -> categorized note, tasks, daily log; archives the source."""
+        raw_text = payload['content']
+        meta = payload['meta']
 
-            # 4. Save to Obsidian (With Smart Categorization)
-            category = self.gardener.smart_categorize(note_data['content'])
-            target_dir = ProjectConfig.OBSIDIAN_VAULT / category
-            target_dir.mkdir(parents=True, exist_ok=True)
-            
-            note_filename = f"{note_data['title']}.md"
-            target_path = target_dir / note_filename
-            
-            with open(target_path, 'w', encoding='utf-8') as f:
-                f.write(note_data['content'])
-            
-            logger.info(f"Saved and categorized note to: {target_path} (Category: {category})")
+        if not raw_text:
+            logger.warning("Empty transcript generated.")
+            return
 
-            # [UX] Notification
-            send_windows_notification("BrainGuard", f"Gotowe: {note_data['title']}")
+        # 2-3. Generate Note Content (Summary & Body) + Extract Tasks (Life Admin), concurrently
+        note_data, tasks = self._note_and_tasks(raw_text, meta)
 
-            # 5. Archive Source Audio
-            self._archive_file(file_path)
+        # Append Life Admin section to content
+        if tasks:
+            life_section = "\n\n## 🏠 Life Admin & Tasks\n" + "\n".join([f"- [ ] {t}" for t in tasks])
+            note_data['content'] += life_section
 
-            # 6. Update Daily Log (Optional - keeping it for history)
-            try:
-                self.gardener.update_daily_log(
-                    title=note_data['title'],
-                    summary=note_data['summary'],
-                    tasks=tasks,
-                    note_path=str(target_path)
-                )
-            except Exception as log_err:
-                logger.warning(f"Could not update daily log: {log_err}")
+        # 4. Save to Obsidian (With Smart Categorization)
+        category = self.gardener.smart_categorize(note_data['content'])
+        target_dir = ProjectConfig.OBSIDIAN_VAULT / category
+        target_dir.mkdir(parents=True, exist_ok=True)
+        
+        note_filename = f"{note_data['title']}.md"
+        target_path = target_dir / note_filename
+        
+        with open(target_path, 'w', encoding='utf-8') as f:
+            f.write(note_data['content'])
+        
+        logger.info(f"Saved and categorized note to: {target_path} (Category: {category})")
 
-        except Exception as e:
-            logger.error(f"Processing failed for {file_path}: {e}", exc_info=True)
+        # [UX] Notification
+        send_windows_notification("BrainGuard", f"Gotowe: {note_data['title']}")
+
+        # 5. Archive Source Audio
+        self._archive_file(file_path)
 
+        # 6. Update Daily Log (Optional - keeping it for history)
+        try:
+            self.gardener.update_daily_log(
+                title=note_data['title'],
+                summary=note_data['summary'],
+                tasks=tasks,
+                note_path=str(target_path)
+            )
+        except Exception as log_err:
+            logger.warning(f"Could not update daily log: {log_err}")
 
 if __name__ == "__main__":
     # Ensure Inbox exists
@@ -627,7 +727,12 @@ if __name__ == "__main__":
             else:
                 event_handler.process_file(existing_file)
 
-    observer = Observer()
+    if ProjectConfig.WATCHER_BACKEND == "inotify":
+        from watchdog.observers.inotify import InotifyObserver
+        observer = InotifyObserver()
+    else:
+        observer = PollingObserver()
+    # Only the inbox itself; Archive/ below it must not trigger processing
     observer.schedule(event_handler, str(inbox_path), recursive=False)
     
     logger.info(f"Monitoring {inbox_path} ... Press Ctrl+C to stop.")
@@ -1,6 +1,6 @@
-import ollama
 import sys
 from config import ProjectConfig, logger
+from utils.ollama_client import get_client
 
 def check_ollama():
     model_name = ProjectConfig.OLLAMA_MODEL
@@ -8,7 +8,7 @@ def check_ollama():
     
     try:
         # Check if Ollama is running by listing models
-        response = ollama.list()
+        response = get_client().list()
         
         # Newer versions of ollama-python use objects, older use dicts
         available_models = []
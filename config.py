@@ -20,6 +20,9 @@ class Settings(BaseSettings):
     CHROMA_DB_DIR: Path = Field(default=BASE_DIR / "obsidian_db")
     INBOX_DIR: Path = Field(default=BASE_DIR / "obsidian_db" / "_INBOX")
     TEMP_DIR: Path = Field(default=BASE_DIR / "temp_processing")
+    CACHE_DIR: Path = Field(default=BASE_DIR / "obsidian_db" / "_LLM_CACHE")
+    # RAG chat transcript (JSONL, one message per line, append-only)
+    CHAT_HISTORY_FILE: Path = Field(default=BASE_DIR / "obsidian_db" / "chat_history.jsonl")
 
     # LLM Settings (Ollama)
     OLLAMA_URL: str = Field(default="http://localhost:11434")
@@ -27,6 +30,13 @@ class Settings(BaseSettings):
     OLLAMA_MODEL: str = Field(default="SpeakLeash/bielik-11b-v2.3-instruct:Q5_K_M")
     # Fast "Worker" Model (Tagging, Metadata, Simple JSON) - Low VRAM usage
     OLLAMA_MODEL_FAST: str = Field(default="llama3.2:latest")
+    # Max concurrent requests per pipeline; keep in sync with OLLAMA_NUM_PARALLEL on the server
+    OLLAMA_NUM_PARALLEL: int = Field(default=4)
+    # BrainGuard only: how long Ollama keeps its models loaded after each request (the UI keeps Ollama's 5 min default);
+    # shorter frees VRAM for Whisper sooner
+    OLLAMA_KEEP_ALIVE: str = Field(default="1h")
+    # Load the chat + embedding models in the background when the UI starts (first question skips the cold load)
+    OLLAMA_WARMUP: bool = Field(default=True)
     
     # External APIs
     HF_TOKEN: Optional[str] = None
@@ -35,8 +45,33 @@ class Settings(BaseSettings):
     # RAG Settings
     RAG_CHUNK_SIZE: int = Field(default=1000)
     RAG_CHUNK_OVERLAP: int = Field(default=200)
+    # Approx. tokens of chat history sent with each question (prefill cost grows with it)
+    RAG_HISTORY_TOKEN_BUDGET: int = Field(default=4096)
     EMBEDDING_MODEL: str = Field(default="mxbai-embed-large")
 
+    # Transcription Settings (Whisper)
+    # Keep up to two Whisper models resident between in-process runs (faster model switches, holds VRAM)
+    WHISPER_KEEP_LOADED: bool = Field(default=False)
+    # CTranslate2 compute type; None = int8_float16 on CUDA (~40% less VRAM than float16), int8 on CPU
+    WHISPER_COMPUTE_TYPE: Optional[str] = Field(default=None)
+    # Spoken language (e.g. "pl") to skip Whisper's language detection; None = detect per file
+    WHISPER_LANGUAGE: Optional[str] = Field(default=None)
+    # Socket of transcriber_server.py; while it runs, the app and BrainGuard share its Whisper instead of loading their own
+    TRANSCRIBER_SOCKET: Path = Field(default=BASE_DIR / "obsidian_db" / "transcriber.sock")
+    # BrainGuard: also write its transcripts to INBOX_DIR (it works from the in-memory payload either way)
+    PERSIST_TRANSCRIPT_JSON: bool = Field(default=True)
+
+    # Refinery Settings
+    # Inbox files refined concurrently by the batch button (each runs up to OLLAMA_NUM_PARALLEL chunk requests)
+    REFINERY_WORKERS: int = Field(default=2)
+    # Keyword hits per 1000 chars below which short texts (<3000 chars) skip the LLM entirely
+    MIN_SIGNAL_DENSITY: float = Field(default=0.2)
+
+    # BrainGuard Settings
+    # Inbox watcher: "polling" also sees files written from Windows into /mnt/c (no inotify events there);
+    # "inotify" (Linux filesystems only) reacts on close-after-write without polling or copy-wait probes
+    WATCHER_BACKEND: str = Field(default="polling")
+
     # Security & Compliance
     STRICT_MODE: bool = Field(default=True)
     LOG_LEVEL: str = Field(default="INFO")
@@ -54,6 +89,7 @@ class Settings(BaseSettings):
         self.CHROMA_DB_DIR.mkdir(parents=True, exist_ok=True)
         self.INBOX_DIR.mkdir(parents=True, exist_ok=True)
         self.TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
     def setup_logging(self):
         """Configures standard Python logging with DORA/NIS2 tagging intent."""
@@ -1,11 +1,11 @@
 import feedparser
 import os
 import json
-import ollama
 import logging
 import asyncio
 import re
 import requests
+import httpx
 import edge_tts
 from datetime import datetime
 from typing import Set, Optional, List, Dict, Any
@@ -14,7 +14,7 @@ from pathlib import Path
 from config import ProjectConfig, logger
 from ai_research import WebResearcher
 from obsidian_manager import ObsidianGardener
-from rag_engine import ObsidianRAG
+from utils.ollama_client import get_client
 
 class NewsAgent:
     """
@@ -33,8 +33,9 @@ class NewsAgent:
         "Zaufana Trzecia Strona": "https://zaufanatrzeciastrona.pl/feed/",
         "The Hacker News": "https://feeds.feedburner.com/TheHackersNews"
     }
+    FEED_TIMEOUT = 15.0
 
-    def __init__(self):
+    def __init__(self, rag=None, gardener: Optional[ObsidianGardener] = None, researcher: Optional[WebResearcher] = None):
         self.news_dir = ProjectConfig.OBSIDIAN_VAULT / "Newsy"
         self.news_dir.mkdir(parents=True, exist_ok=True)
         self.history_file = ProjectConfig.BASE_DIR / "processed_news.json"
@@ -43,17 +44,24 @@ class NewsAgent:
         self.model = ProjectConfig.OLLAMA_MODEL # Heavy (Summarization)
         self.fast_model = ProjectConfig.OLLAMA_MODEL_FAST # Light (Filtering)
         
-        self.researcher = WebResearcher(gardener=self.gardener)
-        self.rag = ObsidianRAG() # For cross-checking impact
-        self.gardener = ObsidianGardener()
+        self.gardener = gardener or ObsidianGardener()
+        self.researcher = researcher or WebResearcher(gardener=self.gardener)
+        # Caller's engine when given, so ChromaDB is not opened again
+        self._rag = rag
+
+    @property
+    def rag(self):
+        """RAG engine for cross-checking impact; chromadb is imported on first use."""
+        if self._rag is None:
+            from rag_engine import ObsidianRAG
+            self._rag = ObsidianRAG()
+        return self._rag
 
     def _load_history(self) -> Set[str]:
-        if self.history_file.exists():
-            try:
-                return set(json.loads(self.history_file.read_text()))
-            except:
-                return set()
-        return set()
+        try:
+            return set(json.loads(self.history_file.read_text()))
+        except:  # missing (first run) or corrupt
+            return set()
 
     def _save_history(self, history: Set[str]):
         self.history_file.write_text(json.dumps(list(history)))
@@ -70,7 +78,7 @@ class NewsAgent:
             "Reply ONLY 'YES' or 'NO'."
         )
         try:
-            resp = ollama.chat(
+            resp = get_client().chat(
                 model=self.fast_model,
                 messages=[{'role': 'user', 'content': f"{prompt}\n\nTitle: {title}\nSnippet: {summary_snippet}"}]
             )
@@ -114,7 +122,7 @@ class NewsAgent:
         """
         try:
             # Extract keywords first
-            keywords_resp = ollama.chat(
+            keywords_resp = get_client().chat(
                 model=self.fast_model,
                 messages=[{'role': 'user', 'content': f"Extract 3 main technology names (libraries, frameworks, software) from this text. Comma separated.\n\n{text[:1000]}"}]
             )
@@ -122,9 +130,9 @@ class NewsAgent:
             
             # Query RAG
             query = f"Czy używam technologii: {keywords}? Czy mam projekty z tym związane?"
-            rag_response = self.rag.query(query, n_results=3)
+            rag_response, sources = self.rag.query(query, n_results=3)
             
-            if "Brak odpowiednich notatek" in rag_response:
+            if not sources or "Brak odpowiednich notatek" in rag_response:
                 return ""
             
             return f"\n> ⚠️ **Analiza Wpływu (RAG):**\n> System wykrył potencjalne powiązania w Twojej bazie wiedzy:\n> {rag_response[:300]}...\n"
@@ -145,7 +153,7 @@ class NewsAgent:
             "Ignoruj marketing."
         )
         try:
-            resp = ollama.chat(model=self.model, messages=[
+            resp = get_client().chat(model=self.model, messages=[
                 {'role': 'system', 'content': prompt},
                 {'role': 'user', 'content': f"Tytuł: {entry.title}\n\nTreść: {content[:8000]}"}
             ])
@@ -191,38 +199,39 @@ class NewsAgent:
         filename = f"{date_str}-Cyber-Briefing.md"
         path = self.news_dir / filename
         
-        # Header
-        content = f"# 🛡️ Cyber Briefing: {date_str}\n**Zebrane Newsy:** {len(articles)} | **Status:** Wygenerowano automatycznie\n\n---\n"
-        tts_buffer = ""
+        # Header (title line kept separate: it is dropped when appending to an existing digest)
+        title_line = f"# 🛡️ Cyber Briefing: {date_str}"
+        parts = [f"\n**Zebrane Newsy:** {len(articles)} | **Status:** Wygenerowano automatycznie\n\n---\n"]
+        tts_parts = []
 
         # Body
         for article in articles:
+            parts.append(f"\n## {article['title']}\n")
+            parts.append(f"🔗 [Link do źródła]({article['url']}) | 📰 {article['source']}\n\n")
             # CVE Badge
-            cve_section = ""
             if article['cves']:
                 for cve in article['cves']:
                     score = float(cve['cvss']) if cve['cvss'] != 'N/A' else 0
                     color = "🔴" if score >= 9.0 else "🟡" if score >= 7.0 else "🟢"
-                    cve_section += f"{color} **{cve['id']}** (CVSS: {cve['cvss']}) "
-                cve_section += "\n"
-
-            content += f"\n## {article['title']}\n"
-            content += f"🔗 [Link do źródła]({article['url']}) | 📰 {article['source']}\n\n"
-            content += cve_section
-            content += f"{article['summary']}\n"
-            content += f"{article['impact']}\n"
-            content += "---\n"
+                    parts.append(f"{color} **{cve['id']}** (CVSS: {cve['cvss']}) ")
+                parts.append("\n")
+            parts.append(f"{article['summary']}\n")
+            parts.append(f"{article['impact']}\n")
+            parts.append("---\n")
 
             # Buffer for Audio (shorter version)
-            tts_buffer += f"News: {article['title']}. {article['summary'][:200]}. "
+            tts_parts.append(f"News: {article['title']}. {article['summary'][:200]}. ")
+
+        body = "".join(parts)
+        tts_buffer = "".join(tts_parts)
 
         # Save MD
         if path.exists():
-            # Append if exists (in case ran multiple times a day)
+            # Append if exists (in case ran multiple times a day), without the title line
             with open(path, 'a', encoding='utf-8') as f:
-                f.write(content.replace(f"# 🛡️ Cyber Briefing: {date_str}", "")) # Remove header for append
+                f.write(body)
         else:
-            path.write_text(content, encoding='utf-8')
+            path.write_text(title_line + body, encoding='utf-8')
         
         # Link
         self.gardener.process_file(str(path))
@@ -231,16 +240,32 @@ class NewsAgent:
         # Generate Audio (Async wrapper)
         asyncio.run(self._generate_audio_briefing(tts_buffer, date_str))
 
+    async def _fetch_feed(self, client: httpx.AsyncClient, source: str, url: str):
+        """Downloads one feed; parsing runs in a worker thread so it overlaps the other downloads."""
+        try:
+            response = await client.get(url)
+            response.raise_for_status()
+            return await asyncio.to_thread(feedparser.parse, response.content)
+        except Exception as e:
+            logger.error(f"Feed error ({source}): {e}")
+            return None
+
+    async def _fetch_feeds(self) -> Dict[str, Any]:
+        """All feeds concurrently: wall-clock is the slowest feed, not the sum."""
+        async with httpx.AsyncClient(timeout=self.FEED_TIMEOUT, follow_redirects=True) as client:
+            feeds = await asyncio.gather(*(self._fetch_feed(client, source, url) for source, url in self.RSS_FEEDS.items()))
+        return {source: feed for source, feed in zip(self.RSS_FEEDS, feeds) if feed is not None}
+
     def run(self, limit: int = 5):
         """Main Orchestrator."""
         history = self._load_history()
         articles_buffer = []
         
         logger.info("NewsAgent started. Scanning feeds...", extra={"tags": "NEWS-START"})
+        feeds = asyncio.run(self._fetch_feeds())
         
-        for source, url in self.RSS_FEEDS.items():
+        for source, feed in feeds.items():
             try:
-                feed = feedparser.parse(url)
                 logger.info(f"Feed: {source} - Found {len(feed.entries)} entries.")
                 
                 processed_count = 0
@@ -1,14 +1,12 @@
-import os
 import datetime
-import shutil
 import logging
-from typing import List, Tuple, Optional
+import threading
+from typing import List, Set, Tuple, Optional
 from pathlib import Path
 from flashtext import KeywordProcessor
 
 from config import ProjectConfig, logger
-# Import RAG ONLY if needed to avoid circular imports during init
-from rag_engine import ObsidianRAG
+from utils.fs import iter_md_files, move_file
 
 class LinkOptimizer:
     """
@@ -19,18 +17,35 @@ class LinkOptimizer:
         self.processor = KeywordProcessor(case_sensitive=False)
         self.titles_set = set(vault_titles)
         
-        # Build dictionary: "Linux" -> "[[Linux]]"
+        # Build dictionary: "[[Linux]]" -> ["Linux"], loaded into the trie in one call
+        # (skips very short generic names)
+        links = {}
         for title in vault_titles:
-            # Skip very short generic names
-            if len(title) < 3: continue 
-            
+            if len(title) < 3: continue
             clean_title = title.replace(".md", "")
-            self.processor.add_keyword(clean_title, f"[[{clean_title}]]")
+            links[f"[[{clean_title}]]"] = [clean_title]
+        self.processor.add_keywords_from_dict(links)
 
     def process_text(self, text: str) -> str:
         """Injects wikilinks into text in a single pass."""
         return self.processor.replace_keywords(text)
 
+    def link_and_collect(self, text: str) -> Tuple[str, Set[str]]:
+        """
+        One FlashText pass that both injects wikilinks and reports which titles were linked
+        (replace_keywords alone discards the matches, so callers used to scan again).
+        """
+        parts = []
+        linked = set()
+        pos = 0
+        for link, start, end in self.processor.extract_keywords(text, span_info=True):
+            parts.append(text[pos:start])
+            parts.append(link)
+            linked.add(link[2:-2])
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts), linked
+
 class ObsidianGardener:
     """
     Manager for Vault operations: Auto-linking, Tagging, and Cleaning.
@@ -41,27 +56,34 @@ class ObsidianGardener:
         self.vault_path = Path(vault_path) if vault_path else ProjectConfig.OBSIDIAN_VAULT
         self.logger = logging.getLogger("ObsidianGardener")
         self.rag = None # Lazy load RAG to avoid heavy startup if not needed
+        # Shared by Refinery batch workers: guards vault writes and lazy RAG init
+        self._lock = threading.Lock()
         
         # Initialize LinkOptimizer with current vault state
         self.existing_notes = self._scan_vault()
         self.optimizer = LinkOptimizer(self.existing_notes)
 
+    def refresh(self):
+        """Re-scans the vault and swaps in a new automaton (e.g. after notes were added or renamed by hand)."""
+        notes = self._scan_vault()
+        optimizer = LinkOptimizer(notes)
+        # Readers keep using the old automaton until the swap
+        self.existing_notes, self.optimizer = notes, optimizer
+
     def _scan_vault(self) -> List[str]:
         """Index all note titles from the vault."""
-        titles = []
-        if not self.vault_path.exists():
-            return titles
-        for root, _, files in os.walk(self.vault_path):
-            for file in files:
-                if file.endswith(".md"):
-                    titles.append(file[:-3]) # Remove .md
+        # Notes in .obsidian/.trash are not link targets
+        titles = [entry.name[:-3] for entry in iter_md_files(self.vault_path)]  # Remove .md
         self.logger.info(f"Gardener indexed {len(titles)} notes for auto-linking.", extra={"tags": "GARDENER-INDEX"})
         return titles
 
     def _get_rag(self):
         """Lazy loader for RAG engine."""
-        if not self.rag:
-            self.rag = ObsidianRAG()
+        with self._lock:
+            if not self.rag:
+                # Imported here: chromadb + embeddings are only needed once semantic links are requested
+                from rag_engine import ObsidianRAG
+                self.rag = ObsidianRAG()
         return self.rag
 
     def update_dashboard(self):
@@ -139,15 +161,14 @@ LIMIT 10
         timestamp = datetime.datetime.now().strftime("%H:%M")
         link = f"[[{title}]]" if title else "Nieznana notatka"
         
-        log_entry = f"\n### 🤖 {timestamp} - Przetworzono: {link}\n"
-        log_entry += f"> {summary[:300]}...\n\n"
+        parts = [f"\n### 🤖 {timestamp} - Przetworzono: {link}\n", f"> {summary[:300]}...\n\n"]
         
         if tasks:
-            log_entry += "**🛠️ Wykryte zadania:**\n"
-            for task in tasks:
-                log_entry += f"- [ ] {task}\n"
+            parts.append("**🛠️ Wykryte zadania:**\n")
+            parts.extend(f"- [ ] {task}\n" for task in tasks)
         else:
-            log_entry += "_Brak wykrytych zadań._\n"
+            parts.append("_Brak wykrytych zadań._\n")
+        log_entry = "".join(parts)
 
         # Append to file
         try:
@@ -163,22 +184,22 @@ LIMIT 10
         """Archives the source file to Resources folder."""
         try:
             src = Path(source_path)
-            if not src.exists():
-                return
-                
             archive_dir = self.vault_path / "Zasoby" / subfolder
             archive_dir.mkdir(parents=True, exist_ok=True)
             
             dest = archive_dir / src.name
-            shutil.move(str(src), str(dest))
+            try:
+                move_file(src, dest)
+            except FileNotFoundError:  # already archived or removed
+                return
             self.logger.info(f"Archived file to: {dest}", extra={"tags": "GARDENER-ARCHIVE"})
         except Exception as e:
             self.logger.error(f"Failed to archive file: {e}")
 
-    def suggest_semantic_links(self, text: str) -> str:
+    def suggest_semantic_links(self, text: str, linked_titles: Optional[Set[str]] = None) -> str:
         """
         Uses Vector DB to find related concepts that don't match keywords exactly.
-        Appends a 'Related' section.
+        Appends a 'Related' section. `linked_titles` (from link_and_collect) skips the keyword re-scan.
         """
         try:
             rag = self._get_rag()
@@ -190,7 +211,9 @@ LIMIT 10
                 return text
 
             # Filter out notes that are already linked in text
-            existing_links = set(self.optimizer.processor.extract_keywords(text))
+            if linked_titles is None:
+                _, linked_titles = self.optimizer.link_and_collect(text)
+            existing_links = linked_titles
             
             append_text = "\n\n## 🧠 Powiązane semantycznie (AI)\n"
             added = False
@@ -211,15 +234,16 @@ LIMIT 10
         """Reads, links and saves a specific note."""
         try:
             path = Path(file_path)
-            if not path.exists(): return False, "File not found."
+            try:
+                content = path.read_text(encoding='utf-8')
+            except FileNotFoundError:
+                return False, "File not found."
             
-            content = path.read_text(encoding='utf-8')
-            
-            # 1. FlashText Auto-linking (Fast)
-            new_content = self.optimizer.process_text(content)
+            # 1. FlashText Auto-linking (Fast), linked titles collected in the same pass
+            new_content, linked_titles = self.optimizer.link_and_collect(content)
             
             # 2. Semantic Linking (Smart - Optional/Slower)
-            new_content = self.suggest_semantic_links(new_content) 
+            new_content = self.suggest_semantic_links(new_content, linked_titles)
 
             if new_content != content:
                 path.write_text(new_content, encoding='utf-8')
@@ -236,6 +260,11 @@ LIMIT 10
         """Wrapper for FlashText optimizer to support app.py."""
         return self.optimizer.process_text(text)
 
+    def apply(self, text: str, tags: List[str]) -> Tuple[str, List[str], Set[str]]:
+        """Links and tags a generated note: one FlashText pass plus tag normalization."""
+        linked_text, linked_titles = self.optimizer.link_and_collect(text)
+        return linked_text, self.smart_tagging(tags), linked_titles
+
     def smart_tagging(self, tags: List[str]) -> List[str]:
         """
         Deduplicates and normalizes tags. 
@@ -251,35 +280,40 @@ LIMIT 10
                 clean_tags.add(t)
         return list(clean_tags)
 
-    def save_note(self, title: str, content: str, tags: list) -> Path:
-        """Saves a markdown note to the vault with YAML frontmatter."""
+    def save_note(self, title: str, content: str, tags: list, subfolder: Optional[str] = None) -> Path:
+        """
+        Saves a markdown note to the vault with YAML frontmatter.
+        `subfolder` (relative to the vault, created if missing) writes it straight to its final place, no move afterwards.
+        """
         filename = f"{title}.md"
         # Sanitize filename
         filename = "".join([c for c in filename if c.isalnum() or c in (' ', '.', '_', '-')]).strip()
         
-        full_path = self.vault_path / filename
+        target_dir = self.vault_path / subfolder if subfolder else self.vault_path
+        if subfolder:
+            target_dir.mkdir(parents=True, exist_ok=True)
+        full_path = target_dir / filename
         
         # Build YAML Frontmatter
-        frontmatter = "---\n"
-        frontmatter += f"title: {title}\n"
-        frontmatter += f"date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}\n"
+        parts = ["---\n", f"title: {title}\n", f"date: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}\n"]
         if tags:
-            frontmatter += "tags:\n"
+            parts.append("tags:\n")
             for t in tags:
                 # Ensure tag is clean
                 t = t.replace("#", "").strip().lower()
-                frontmatter += f"  - {t}\n"
-        frontmatter += "---\n\n"
-        
-        final_content = frontmatter + content
+                parts.append(f"  - {t}\n")
+        parts.append("---\n\n")
+        parts.append(content)
 
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(final_content)
+        with self._lock:
+            # Parts go straight into the 1 MiB write buffer; no joined copy of the note
+            with open(full_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                f.writelines(parts)
+                
+            logger.info(f"Note saved with YAML: {full_path}", extra={"tags": "OBSIDIAN-SAVE"})
             
-        logger.info(f"Note saved with YAML: {full_path}", extra={"tags": "OBSIDIAN-SAVE"})
-        
-        # Update Dashboard
-        self.update_dashboard()
+            # Update Dashboard
+            self.update_dashboard()
         
         return full_path
 
@@ -288,8 +322,7 @@ LIMIT 10
         Uses LLM to decide which folder the note belongs to.
         """
         try:
-            import ollama
-            from config import ProjectConfig
+            from utils.ollama_client import get_client
             
             categories = ["Education", "Newsy", "Research", "Zasoby", "Daily", "Prywatne", "Review"]
             prompt = f"""
@@ -301,7 +334,7 @@ LIMIT 10
             {content[:2000]}
             """
             
-            response = ollama.chat(
+            response = get_client().chat(
                 model=ProjectConfig.OLLAMA_MODEL_FAST,
                 messages=[{'role': 'user', 'content': prompt}]
             )
@@ -2,7 +2,6 @@ import os
 import io
 import logging
 import pdfplumber
-import ollama
 import json
 import shutil
 from typing import List, Dict, Optional, Tuple, Any
@@ -12,6 +11,7 @@ from google.cloud import vision
 
 from config import ProjectConfig, logger
 from obsidian_manager import ObsidianGardener
+from utils.ollama_client import get_client
 
 class PDFShredder:
     """
@@ -26,12 +26,15 @@ class PDFShredder:
         "FINANSE": ["faktura", "rachunek", "płatność", "kwota", "brutto", "netto", "vat", "przelew", "termin płatności"],
         "ZDROWIE": ["badanie", "wynik", "pacjent", "lekarz", "skierowanie", "recepta", "laboratorium"]
     }
+    # Flat (lowercase keyword, tag) table, built once at class load
+    _KW_TABLE = tuple((kw.lower(), tag) for tag, keywords in COMPLIANCE_MAP.items() for kw in keywords)
 
-    def __init__(self, vault_path: Optional[str] = None):
+    def __init__(self, vault_path: Optional[str] = None, gardener: Optional[ObsidianGardener] = None):
         self.vault_path = Path(vault_path) if vault_path else ProjectConfig.OBSIDIAN_VAULT
         self.output_dir = self.vault_path / "Compliance"
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.logger = logging.getLogger("PDFShredder")
+        self._gardener = gardener
 
         # Google Vision Setup
         if ProjectConfig.GOOGLE_APPLICATION_CREDENTIALS and ProjectConfig.GOOGLE_APPLICATION_CREDENTIALS.exists():
@@ -41,14 +44,22 @@ class PDFShredder:
             self.vision_client = None
             self.logger.warning("Google Vision credentials not found. OCR will be disabled.")
 
+    @property
+    def gardener(self) -> ObsidianGardener:
+        """The caller's gardener, or one built on first use and reused, so the vault is indexed once per process, not per file."""
+        if self._gardener is None:
+            self._gardener = ObsidianGardener(str(self.vault_path))
+        return self._gardener
+
     def detect_compliance_tags(self, text: str) -> List[str]:
         """Automated Compliance Tagging (Point 6 of Audit)."""
-        tags = []
+        found = set()
         text_lower = text.lower()
-        for tag, keywords in self.COMPLIANCE_MAP.items():
-            if any(kw.lower() in text_lower for kw in keywords):
-                tags.append(tag)
-        return tags if tags else ["General"]
+        for kw, tag in self._KW_TABLE:
+            # Skip the substring search for tags that already matched
+            if tag not in found and kw in text_lower:
+                found.add(tag)
+        return [tag for tag in self.COMPLIANCE_MAP if tag in found] or ["General"]
 
     def ocr_pdf_fallback(self, pdf_path: str) -> str:
         """OCR fallback using Google Vision for PDF files with no text layer."""
@@ -126,7 +137,7 @@ class PDFShredder:
         Zwróć TYLKO nazwę pliku, bez rozszerzenia.
         """
         try:
-            response = ollama.chat(
+            response = get_client().chat(
                 model=ProjectConfig.OLLAMA_MODEL_FAST,
                 messages=[{'role': 'user', 'content': f"{prompt}\n\nTekst: {text[:2000]}"}]
             )
@@ -150,7 +161,7 @@ class PDFShredder:
         Zwróć JSON. Jeśli nie znaleziono, zwróć pusty JSON {}.
         """
         try:
-            response = ollama.chat(
+            response = get_client().chat(
                 model=ProjectConfig.OLLAMA_MODEL_FAST,
                 messages=[{'role': 'user', 'content': f"{prompt}\n\nTekst: {text[:3000]}"}],
                 format='json'
@@ -175,7 +186,7 @@ class PDFShredder:
         Jeśli to zdjęcie przedmiotu/miejsca, opisz co to jest na podstawie etykiet i tekstu.
         """
         try:
-            response = ollama.chat(
+            response = get_client().chat(
                 model=ProjectConfig.OLLAMA_MODEL, # Use the smarter model
                 messages=[{'role': 'user', 'content': prompt}]
             )
@@ -210,8 +221,7 @@ class PDFShredder:
         final_path = self.save_as_note(safe_title, content, tags, home_data)
         
         # 4. Auto-linking via Gardener
-        gardener = ObsidianGardener(str(self.vault_path))
-        gardener.process_file(final_path)
+        self.gardener.process_file(final_path)
         
         return True, str(final_path)
 
@@ -271,21 +281,19 @@ class PDFShredder:
             # 4. Save structured note
             final_path = self.save_as_note(new_filename, text_content, tags, home_data)
             
-            # Embed image in note
-            with open(final_path, 'r+') as f:
+            # Embed image in note, then append Image Analysis info (Summary before Visual Analysis details)
+            with open(final_path, 'r+', encoding='utf-8') as f:
                 content = f.read()
                 f.seek(0, 0)
-                f.write(f"![[{saved_image_name}]]\n\n" + content)
-                
-                # Append Image Analysis info
-                f.seek(0, 2) # End of file
-                # Insert Summary before Visual Analysis details
-                f.write(f"\n\n## 🧠 Analiza AI\n{ai_summary}\n")
-                f.write(f"\n## Visual Analysis\n**Detected Objects:** {', '.join(labels)}\n")
+                # One buffered write of the whole note instead of concatenating it first
+                f.writelines((
+                    f"![[{saved_image_name}]]\n\n", content,
+                    f"\n\n## 🧠 Analiza AI\n{ai_summary}\n",
+                    f"\n## Visual Analysis\n**Detected Objects:** {', '.join(labels)}\n",
+                ))
 
             # 5. Auto-linking via Gardener
-            gardener = ObsidianGardener(str(self.vault_path))
-            gardener.process_file(final_path)
+            self.gardener.process_file(final_path)
             
             return True, str(final_path)
 
@@ -1,16 +1,38 @@
 import hashlib
 import logging
 import time
-from typing import List, Dict, Set, Optional, Any
+import sys
+from typing import AsyncIterator, List, Dict, Set, Optional, Any
 from pathlib import Path
 
 import chromadb
-import ollama
 from sentence_transformers import CrossEncoder
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from tqdm import tqdm
 
 from config import ProjectConfig, logger
+from utils.fs import iter_md_files
+from utils.ollama_client import get_client, async_client
+
+# Chunks sent per Ollama embed request while indexing
+EMBED_BATCH_SIZE = 64
+
+# Rough chars-per-token ratio for budget estimates (no model tokenizer needed)
+CHARS_PER_TOKEN = 4
+
+def trim_history(history: List[Dict], token_budget: int) -> List[Dict]:
+    """Newest user/assistant messages whose estimated size fits `token_budget`, in original order."""
+    kept = []
+    remaining = token_budget * CHARS_PER_TOKEN
+    for message in reversed(history):
+        if message.get('role') not in ('user', 'assistant'):
+            continue
+        remaining -= len(message.get('content') or '')
+        if remaining < 0:
+            break
+        kept.append(message)
+    kept.reverse()
+    return kept
 
 class ObsidianRAG:
     """
@@ -64,43 +86,84 @@ class ObsidianRAG:
                     }
         return indexed
 
+    def _touch_mtime(self, file_name: str, mtime: str):
+        """Records a new mtime for a file whose content is unchanged, so the next reindex skips it unread."""
+        chunks = self.collection.get(where={"filename": file_name}, include=['metadatas'])
+        if chunks['ids']:
+            self.collection.update(
+                ids=chunks['ids'],
+                metadatas=[{**meta, "mtime": mtime} for meta in chunks['metadatas']],
+            )
+
     def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generates embeddings using local Ollama model."""
+        """Generates embeddings using local Ollama model, one /api/embed request per EMBED_BATCH_SIZE texts."""
+        client = get_client()
         embeddings = []
-        for text in texts:
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
             try:
-                resp = ollama.embeddings(model=self.embedding_model, prompt=text)
-                embeddings.append(resp["embedding"])
+                resp = client.embed(model=self.embedding_model, input=texts[start:start + EMBED_BATCH_SIZE])
+                embeddings.extend(resp["embeddings"])
             except Exception as e:
                 self.logger.error(f"Embedding failed: {e}", extra={"tags": "RAG-ERROR"})
                 raise e
         return embeddings
 
-    def index_vault(self, vault_path: Path) -> int:
-        """Performs Incremental Indexing of the Obsidian Vault."""
+    def _upsert_pending(self, pending: List[Dict[str, list]]) -> int:
+        """Embeds the chunks of several files in shared batches and upserts them in one call."""
+        if not pending:
+            return 0
+        documents = [c for item in pending for c in item["documents"]]
+        try:
+            embeddings = self._get_embeddings(documents)
+            self.collection.upsert(
+                ids=[i for item in pending for i in item["ids"]],
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=[m for item in pending for m in item["metadatas"]],
+            )
+        except Exception as e:
+            names = ", ".join(item["metadatas"][0]["filename"] for item in pending)
+            self.logger.error(f"Failed to index {names}: {e}")
+            return 0
+        return len(documents)
+
+    def index_vault(self, vault_path: Path, progress_callback=None) -> int:
+        """
+        Performs Incremental Indexing of the Obsidian Vault.
+        Files whose mtime matches the indexed one are skipped unread; others are hashed and re-embedded only if the content changed.
+        Chunks of changed files are collected and embedded EMBED_BATCH_SIZE at a time;
+        `progress_callback(done, total)` is called after each file.
+        """
         if not vault_path.exists():
             self.logger.error(f"Vault path not found: {vault_path}")
             return 0
 
         self.logger.info(f"Starting Incremental Indexing: {vault_path}", extra={"tags": "RAG-INDEX"})
-        all_files = list(vault_path.rglob("*.md"))
+        all_files = list(iter_md_files(vault_path))
         indexed_map = self._get_indexed_metadata()
         
         new_chunks = 0
         current_filenames = set()
+        pending: List[Dict[str, list]] = []
+        pending_count = 0
 
-        for file_path in tqdm(all_files, desc="Indexing Vault"):
-            if file_path.name.startswith('.'): continue
-            
-            file_name = file_path.name
+        for done, entry in enumerate(tqdm(all_files, desc="Indexing Vault", disable=not sys.stderr.isatty()), start=1):
+            if progress_callback: progress_callback(done, len(all_files))
+            file_path = Path(entry.path)
+            file_name = entry.name
             current_filenames.add(file_name)
             
             try:
-                mtime = str(file_path.stat().st_mtime)
+                mtime = str(entry.stat().st_mtime)
+                indexed = indexed_map.get(file_name)
+                # Unchanged mtime: skip without reading the file (the hash is only for touched files)
+                if indexed and indexed["mtime"] == mtime:
+                    continue
                 file_hash = self._get_file_hash(file_path)
 
-                if file_name in indexed_map:
-                    if indexed_map[file_name]["hash"] == file_hash:
+                if indexed:
+                    if indexed["hash"] == file_hash:
+                        self._touch_mtime(file_name, mtime)
                         continue
                     self.collection.delete(where={"filename": file_name})
 
@@ -108,22 +171,28 @@ class ObsidianRAG:
                 chunks = self.splitter.split_text(content)
                 if not chunks: continue
 
-                ids = [f"{file_name}_{i}_{file_hash[:6]}" for i in range(len(chunks))]
-                embeddings = self._get_embeddings(chunks)
-                metadatas = [{
-                    "filename": file_name,
-                    "file_hash": file_hash,
-                    "mtime": mtime,
-                    "chunk_index": i,
-                    "source": str(file_path)
-                } for i in range(len(chunks))]
-
-                self.collection.upsert(ids=ids, embeddings=embeddings, documents=chunks, metadatas=metadatas)
-                new_chunks += len(chunks)
+                pending.append({
+                    "ids": [f"{file_name}_{i}_{file_hash[:6]}" for i in range(len(chunks))],
+                    "documents": chunks,
+                    "metadatas": [{
+                        "filename": file_name,
+                        "file_hash": file_hash,
+                        "mtime": mtime,
+                        "chunk_index": i,
+                        "source": str(file_path)
+                    } for i in range(len(chunks))],
+                })
+                pending_count += len(chunks)
 
             except Exception as e:
                 self.logger.error(f"Failed to process {file_name}: {e}")
 
+            if pending_count >= EMBED_BATCH_SIZE:
+                new_chunks += self._upsert_pending(pending)
+                pending, pending_count = [], 0
+
+        new_chunks += self._upsert_pending(pending)
+
         stale_files = set(indexed_map.keys()) - current_filenames
         if stale_files:
             for sf in stale_files:
@@ -137,7 +206,7 @@ class ObsidianRAG:
         Returns list of {filename, score} for concepts semantically similar to input text.
         """
         try:
-            query_embed = ollama.embeddings(model=self.embedding_model, prompt=text)["embedding"]
+            query_embed = get_client().embeddings(model=self.embedding_model, prompt=text)["embedding"]
             results = self.collection.query(
                 query_embeddings=[query_embed], 
                 n_results=n_results
@@ -159,61 +228,81 @@ class ObsidianRAG:
             self.logger.error(f"Semantic search failed: {e}")
             return []
 
-    def query(self, question: str, history: List[Dict] = None, n_results=5, model_name=None, stream=False):
-        """Retrieves context and generates response with Reranking."""
-        model = model_name or ProjectConfig.OLLAMA_MODEL
-        try:
-            # 1. Retrieval (High Recall)
-            initial_k = 20
-            q_embed = ollama.embeddings(model=self.embedding_model, prompt=question)["embedding"]
-            results = self.collection.query(query_embeddings=[q_embed], n_results=initial_k)
+    def _build_messages(self, question: str, history: List[Dict], n_results: int):
+        """Retrieval + reranking; returns chat messages and the set of source filenames."""
+        # 1. Retrieval (High Recall)
+        initial_k = 20
+        q_embed = get_client().embeddings(model=self.embedding_model, prompt=question)["embedding"]
+        results = self.collection.query(query_embeddings=[q_embed], n_results=initial_k)
+        
+        if not results['documents'] or not results['documents'][0]:
+            context = "Brak odpowiednich notatek w bazie wiedzy."
+            sources = set()
+        else:
+            docs = results['documents'][0]
+            metas = results['metadatas'][0]
             
-            if not results['documents'] or not results['documents'][0]:
-                context = "Brak odpowiednich notatek w bazie wiedzy."
-                sources = set()
-            else:
-                docs = results['documents'][0]
-                metas = results['metadatas'][0]
+            # 2. Reranking (High Precision)
+            if self.cross_encoder:
+                pairs = [[question, doc] for doc in docs]
+                scores = self.cross_encoder.predict(pairs)
                 
-                # 2. Reranking (High Precision)
-                if self.cross_encoder:
-                    pairs = [[question, doc] for doc in docs]
-                    scores = self.cross_encoder.predict(pairs)
-                    
-                    # Sort by score descending
-                    ranked = sorted(zip(docs, metas, scores), key=lambda x: x[2], reverse=True)
-                    
-                    # Take top n_results
-                    top_k = ranked[:n_results]
-                    
-                    # Format context with scores
-                    context = "\n".join([f"--- DOKUMENT: {m['filename']} (Relevance: {s:.2f}) ---\n{d}" for d, m, s in top_k])
-                    sources = {m['filename'] for d, m, s in top_k}
-                else:
-                    # Fallback (Just take top n_results from Vector DB)
-                    # Vector DB results are already sorted by distance (but check if chroma returns sorted?)
-                    # Chroma usually returns sorted by distance.
-                    top_k_docs = docs[:n_results]
-                    top_k_metas = metas[:n_results]
-                    context = "\n".join([f"--- DOKUMENT: {m['filename']} ---\n{d}" for d, m in zip(top_k_docs, top_k_metas)])
-                    sources = {m['filename'] for m in top_k_metas}
-
-            system_msg = f"KONTEKST:\n{context}\n\nOdpowiedz na pytanie na podstawie kontekstu."
-            
-            messages = [{'role': 'system', 'content': system_msg}]
-            if history:
-                messages.extend([m for m in history if m.get('role') in ['user', 'assistant']])
-            messages.append({'role': 'user', 'content': question})
-
-            # Force stream=True if the function is used as a generator in app.py
-            response = ollama.chat(model=model, messages=messages, stream=stream)
-            
-            if stream:
-                return response, sources
+                # Sort by score descending
+                ranked = sorted(zip(docs, metas, scores), key=lambda x: x[2], reverse=True)
+                
+                # Take top n_results
+                top_k = ranked[:n_results]
+                
+                # Format context with scores
+                context = "\n".join([f"--- DOKUMENT: {m['filename']} (Relevance: {s:.2f}) ---\n{d}" for d, m, s in top_k])
+                sources = {m['filename'] for d, m, s in top_k}
             else:
-                return [response], sources
+                # Fallback (Just take top n_results from Vector DB)
+                # Vector DB results are already sorted by distance (but check if chroma returns sorted?)
+                # Chroma usually returns sorted by distance.
+                top_k_docs = docs[:n_results]
+                top_k_metas = metas[:n_results]
+                context = "\n".join([f"--- DOKUMENT: {m['filename']} ---\n{d}" for d, m in zip(top_k_docs, top_k_metas)])
+                sources = {m['filename'] for m in top_k_metas}
 
+        system_msg = f"KONTEKST:\n{context}\n\nOdpowiedz na pytanie na podstawie kontekstu."
+        
+        messages = [{'role': 'system', 'content': system_msg}]
+        if history:
+            messages.extend(trim_history(history, ProjectConfig.RAG_HISTORY_TOKEN_BUDGET))
+        messages.append({'role': 'user', 'content': question})
+        return messages, sources
+
+    async def _stream_answer(self, model: str, messages: List[Dict]) -> AsyncIterator[str]:
+        """Yields answer text pieces from ollama.AsyncClient as they arrive."""
+        try:
+            # Each chat stream runs on its own short-lived loop, so the client is per call
+            async with async_client() as client:
+                async for part in await client.chat(model=model, messages=messages, stream=True):
+                    yield part['message']['content']
+        except Exception as e:
+            self.logger.error(f"LLM stream failed: {e}")
+            yield f"\n⚠️ Błąd generowania: {e}"
+
+    @staticmethod
+    async def _single(text: str) -> AsyncIterator[str]:
+        yield text
+
+    def query(self, question: str, history: List[Dict] = None, n_results=5, model_name=None, stream=False):
+        """
+        Retrieves context and generates response with Reranking.
+        Returns (answer, sources): with stream=True the answer is an async generator of text
+        pieces, otherwise the full answer string.
+        """
+        model = model_name or ProjectConfig.OLLAMA_MODEL
+        try:
+            messages, sources = self._build_messages(question, history, n_results)
         except Exception as e:
             self.logger.error(f"LLM Query failed: {e}")
-            # Yield error in a format compatible with chunk.get('message', {}).get('content')
-            yield {"message": {"content": f"⚠️ Błąd systemowy: {e}"}}
\ No newline at end of file
+            error = f"⚠️ Błąd systemowy: {e}"
+            return (self._single(error) if stream else error), set()
+
+        if stream:
+            return self._stream_answer(model, messages), sources
+        response = get_client().chat(model=model, messages=messages)
+        return response['message']['content'], sources
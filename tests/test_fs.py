@@ -0,0 +1,70 @@
+import sys
+import os
+import io
+import errno
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import fs
+
+def test_move_file_replaces_existing_target(tmp_path):
+    src, dst = tmp_path / "a.txt", tmp_path / "b.txt"
+    src.write_text("new")
+    dst.write_text("old")
+    assert fs.move_file(src, dst) == dst
+    assert dst.read_text() == "new" and not src.exists()
+
+def test_move_file_falls_back_across_filesystems(tmp_path, monkeypatch):
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+    monkeypatch.setattr(fs.os, "replace", cross_device)
+    src, dst = tmp_path / "a.txt", tmp_path / "sub" / "a.txt"
+    dst.parent.mkdir()
+    src.write_text("data")
+    fs.move_file(src, dst)
+    assert dst.read_text() == "data" and not src.exists()
+
+def test_wait_stable(tmp_path):
+    path = tmp_path / "rec.mp3"
+    path.write_bytes(b"x")
+    assert fs.wait_stable(path, interval=0.01)
+    assert not fs.wait_stable(tmp_path / "gone.mp3", interval=0.01)
+
+def test_save_stream_writes_and_removes_part(tmp_path):
+    data = b"x" * (fs.COPY_BLOCK + 10)
+    dst = fs.save_stream(io.BytesIO(data), tmp_path / "memo.mp3", size=len(data))
+    assert dst.read_bytes() == data
+    assert list(tmp_path.iterdir()) == [dst]
+
+def test_save_stream_from_file_object(tmp_path):
+    src = tmp_path / "upload.bin"
+    src.write_bytes(b"y" * (fs.COPY_BLOCK * 2 + 1))
+    with open(src, "rb") as f:
+        dst = fs.save_stream(f, tmp_path / "copy.bin")
+    assert dst.read_bytes() == src.read_bytes()
+
+def test_read_tail(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"".join(b"line %d\n" % i for i in range(1000)))
+    assert fs.read_tail(path, 3, block=16) == [b"line 997", b"line 998", b"line 999"]
+    assert fs.read_tail(path, 5000, block=64) == path.read_bytes().splitlines()
+
+def test_iter_md_files_skips_dot_entries(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.md").write_text("x")
+    (tmp_path / ".trash").mkdir()
+    (tmp_path / ".trash" / "b.md").write_text("x")
+    (tmp_path / ".hidden.md").write_text("x")
+    (tmp_path / "c.txt").write_text("x")
+    assert [e.name for e in fs.iter_md_files(tmp_path)] == ["a.md"]
+
+def test_count_md_files_tracks_changes(tmp_path):
+    (tmp_path / "a.md").write_text("x")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.md").write_text("x")
+    (tmp_path / ".obsidian").mkdir()
+    (tmp_path / ".obsidian" / "c.md").write_text("x")
+    assert fs.count_md_files(str(tmp_path)) == 2
+    (tmp_path / "sub" / "d.md").write_text("x")
+    os.utime(tmp_path / "sub", ns=(0, 1))  # force a new mtime even on coarse-resolution filesystems
+    assert fs.count_md_files(str(tmp_path)) == 3
@@ -0,0 +1,48 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import orjson
+from utils import inbox
+
+PAYLOAD = {
+    "meta": {"title": "Test Video", "uploader": "Kanał"},
+    "content": "treść " * 1000,
+    "segments": [{"start": 0.0, "end": 1.0, "text": "treść"}],
+    "processed_at": 1700000000.0,
+    "status": "ready_for_refinery"
+}
+
+def test_write_payload_creates_header_sidecar(tmp_path):
+    path = tmp_path / "abc.json"
+    inbox.write_payload(path, PAYLOAD)
+    assert inbox.read_payload(path) == PAYLOAD
+    assert inbox.read_header(path) == {
+        "title": "Test Video", "uploader": "Kanał", "processed_at": 1700000000.0,
+        "preview": PAYLOAD["content"][:inbox.PREVIEW_CHARS], "audio": None,
+    }
+    assert not inbox.is_payload_name(inbox.header_path(path).name)
+
+def test_read_header_backfills_legacy_payload(tmp_path):
+    path = tmp_path / "legacy.json"
+    path.write_bytes(orjson.dumps(PAYLOAD))
+    assert inbox.read_header(path)["title"] == "Test Video"
+    assert inbox.header_path(path).exists()
+
+def test_read_header_upgrades_header_without_preview(tmp_path):
+    path = tmp_path / "old.json"
+    path.write_bytes(orjson.dumps(PAYLOAD))
+    inbox.header_path(path).write_bytes(orjson.dumps({"title": "Test Video"}))
+    assert inbox.read_header(path)["preview"].startswith("treść")
+
+def test_archive_and_delete_move_sidecar(tmp_path):
+    path = tmp_path / "abc.json"
+    inbox.write_payload(path, PAYLOAD)
+    target = inbox.archive(path, tmp_path / "archive")
+    assert inbox.header_path(target).exists() and not inbox.header_path(path).exists()
+    # Existing target is overwritten, not an error
+    inbox.write_payload(path, PAYLOAD)
+    assert inbox.archive(path, tmp_path / "archive") == target
+    inbox.delete(target)
+    assert list((tmp_path / "archive").iterdir()) == []
@@ -0,0 +1,57 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import life_admin
+from utils.life_admin import TASK_INPUT_CHARS, TASK_OPTIONS, TASK_PROMPT, CHARS_PER_TOKEN, _head_and_tail, _stream_json
+
+def test_prompt_fits_context_window():
+    prompt = TASK_PROMPT.format(content=_head_and_tail("zadanie " * 10000))
+    assert len(prompt) / CHARS_PER_TOKEN + TASK_OPTIONS["num_predict"] <= TASK_OPTIONS["num_ctx"]
+
+def test_head_and_tail_keeps_short_text():
+    assert _head_and_tail("kup mleko") == "kup mleko"
+
+def test_head_and_tail_keeps_start_and_end():
+    text = "START " + "środek " * 5000 + " KONIEC"
+    fitted = _head_and_tail(text)
+    assert len(fitted) <= TASK_INPUT_CHARS
+    assert fitted.startswith("START") and fitted.endswith("KONIEC")
+    assert "\n[...]\n" in fitted
+
+class _FakeStream:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            self.consumed += 1
+            yield {'message': {'content': piece}}
+
+    def close(self):
+        self.closed = True
+
+class _FakeClient:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def chat(self, **kwargs):
+        return self.stream
+
+def _run(monkeypatch, pieces):
+    stream = _FakeStream(pieces)
+    monkeypatch.setattr(life_admin, "get_client", lambda: _FakeClient(stream))
+    return _stream_json("model", "prompt"), stream
+
+def test_stream_json_stops_on_empty_result(monkeypatch):
+    result, stream = _run(monkeypatch, ['{"tasks": ', '[]', ' ' * 10, '}'])
+    assert result == []
+    assert stream.consumed == 2 and stream.closed
+
+def test_stream_json_stops_after_complete_document(monkeypatch):
+    result, stream = _run(monkeypatch, ['[{"action_item": ', '"kup mleko"}', ']', '\n' * 50])
+    assert result == [{"action_item": "kup mleko"}]
+    assert stream.consumed == 3 and stream.closed
@@ -0,0 +1,31 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai_notes import TranscriptProcessor, CHUNK_MIN_SIZE, CHUNK_MAX_SIZE
+from utils.chunking import chunk_text
+from utils.llm_cache import LLMCache
+
+def _transcript(n_sentences=3000):
+    words = ["sieć", "serwer", "polityka", "ryzyko", "incydent", "audyt", "kopia"]
+    return " ".join(
+        " ".join(words[(i * 5 + j) % 7] for j in range(4 + i % 13)) + f" numer {i}."
+        for i in range(n_sentences)
+    )
+
+def test_chunk_cache_hits_after_preceding_insertion(tmp_path):
+    cache = LLMCache(tmp_path)
+    text = _transcript()
+    key = lambda chunk: TranscriptProcessor.chunk_cache_key("model", "SYSTEM", chunk)
+
+    original = chunk_text(text, min_size=CHUNK_MIN_SIZE, max_size=CHUNK_MAX_SIZE)
+    for chunk in original:
+        cache.set(key(chunk), f"refined: {chunk[:20]}")
+
+    # An inserted introduction shifts every chunk's fragment number
+    edited = chunk_text("Nowy wstęp nagrania. " + text, min_size=CHUNK_MIN_SIZE, max_size=CHUNK_MAX_SIZE)
+    hits = [cache.get(key(chunk)) is not None for chunk in edited]
+    assert len(original) > 3
+    assert not hits[0]
+    assert all(hits[1:])
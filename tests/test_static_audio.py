@@ -0,0 +1,38 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.static_audio import STATIC_AUDIO_URL, audio_source, prune_audio_links
+
+def test_same_named_recordings_get_separate_links(tmp_path):
+    static = tmp_path / "static"
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first, second = tmp_path / "a" / "memo.mp3", tmp_path / "b" / "memo.mp3"
+    first.write_bytes(b"first")
+    second.write_bytes(b"second")
+
+    url_a, url_b = audio_source(first, static), audio_source(second, static)
+    assert url_a.startswith(STATIC_AUDIO_URL) and url_a.endswith(".mp3")
+    assert url_a != url_b
+    assert audio_source(first, static) == url_a  # existing link is reused
+    assert (static / url_a[len(STATIC_AUDIO_URL):]).read_bytes() == b"first"
+
+def test_missing_recording_has_no_source(tmp_path):
+    assert audio_source(tmp_path / "gone.mp3", tmp_path / "static") is None
+
+def test_prune_removes_links_of_deleted_recordings(tmp_path):
+    static = tmp_path / "static"
+    kept, deleted = tmp_path / "kept.wav", tmp_path / "deleted.wav"
+    kept.write_bytes(b"1")
+    deleted.write_bytes(b"2")
+    kept_url = audio_source(kept, static)
+    audio_source(deleted, static)
+    deleted.unlink()
+
+    prune_audio_links(static)
+    assert os.listdir(static) == [kept_url[len(STATIC_AUDIO_URL):]]
+
+def test_prune_without_static_dir(tmp_path):
+    prune_audio_links(tmp_path / "missing")
@@ -0,0 +1,72 @@
+import os
+import sys
+import logging
+import threading
+from multiprocessing.connection import Listener
+
+# Ensure project root is in sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import ProjectConfig
+from video_transcriber import VideoTranscriber
+
+logger = logging.getLogger("TranscriberServer")
+
+# One transcription on the GPU at a time; a second client queues instead of loading its own model
+_gpu_lock = threading.Lock()
+_transcribers = {}
+
+def _handle(conn):
+    """Serves one request: progress messages while it runs, then {"result": ...} or {"error": ...}."""
+    with conn:
+        try:
+            request = conn.recv()
+            model_size = request.get("model_size", "medium")
+            if model_size not in _transcribers:
+                _transcribers[model_size] = VideoTranscriber(model_size=model_size)
+            transcriber = _transcribers[model_size]
+            progress = lambda msg: conn.send({"progress": msg})
+
+            with _gpu_lock:
+                if request["op"] == "transcribe":
+                    result = transcriber._run_transcription_isolated(request["path"], progress)
+                elif request["op"] == "transcribe_batch":
+                    result = transcriber.transcribe_batch(request["paths"], request.get("batch_size", 16), progress)
+                else:
+                    raise ValueError(f"Unknown op: {request['op']}")
+            conn.send({"result": result})
+        except (EOFError, BrokenPipeError):
+            logger.warning("Client disconnected mid-request.")
+        except Exception as e:
+            logger.error(f"Request failed: {e}", exc_info=True)
+            try:
+                conn.send({"error": str(e)})
+            except OSError:
+                pass
+
+def serve(socket_path: str):
+    """Accepts clients on a Unix socket; models stay resident between requests (up to MAX_RESIDENT_MODELS)."""
+    ProjectConfig.WHISPER_KEEP_LOADED = True
+    try:
+        os.unlink(socket_path)  # stale socket from a previous run
+    except FileNotFoundError:
+        pass
+    with Listener(socket_path, family="AF_UNIX") as listener:
+        os.chmod(socket_path, 0o600)
+        logger.info(f"Transcriber server listening on {socket_path}")
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=_handle, args=(conn,), daemon=True).start()
+        finally:
+            # No socket left behind, so clients fall back to local transcription
+            try:
+                os.unlink(socket_path)
+            except FileNotFoundError:
+                pass
+
+if __name__ == "__main__":
+    try:
+        serve(str(ProjectConfig.TRANSCRIBER_SOCKET))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,68 @@
+import re
+import zlib
+from typing import Iterable, Iterator, List, Tuple
+
+# A unit is one sentence or line, including its trailing whitespace, so "".join(units) == text
+# Only the terminators are matched (text between them is sliced), which keeps the scan linear
+# on unpunctuated transcripts with in-word dots ("v1.2", "np.array")
+_UNIT_END_RE = re.compile(r'(?:[.!?]+(?=\s|$)|\n)\s*')
+
+def split_units(text: str) -> Iterator[str]:
+    """Splits text into sentence/line units without dropping any characters."""
+    start = 0
+    for match in _UNIT_END_RE.finditer(text):
+        yield text[start:match.end()]
+        start = match.end()
+    if start < len(text):
+        yield text[start:]
+
+def iter_units(lines: Iterable[str]) -> Iterator[str]:
+    """Lazily splits an iterable of lines (e.g. an open file) into sentence units."""
+    for line in lines:
+        yield from split_units(line)
+
+def iter_cdc_chunks(units: Iterable[str], min_size: int = 3000, max_size: int = 6000, divisor: int = 20) -> Iterator[str]:
+    """
+    Content-defined chunking (FastCDC-style) over sentence units.
+    A boundary is cut after a unit whose hash hits `divisor` once the chunk reaches `min_size`,
+    so identical passages produce identical chunks regardless of their offset in the text.
+    Chunks never exceed `max_size`; oversized units are hard-cut.
+    """
+    buffer: List[str] = []
+    size = 0
+    for unit in units:
+        while len(unit) > max_size:
+            if buffer:
+                yield "".join(buffer)
+                buffer, size = [], 0
+            yield unit[:max_size]
+            unit = unit[max_size:]
+
+        if size + len(unit) > max_size and buffer:
+            yield "".join(buffer)
+            buffer, size = [], 0
+
+        buffer.append(unit)
+        size += len(unit)
+
+        if size >= min_size and zlib.crc32(unit.strip().encode('utf-8')) % divisor == 0:
+            yield "".join(buffer)
+            buffer, size = [], 0
+
+    if buffer:
+        yield "".join(buffer)
+
+def chunk_text(text: str, **kwargs) -> List[str]:
+    """Convenience wrapper: content-defined chunks of a whole string."""
+    return list(iter_cdc_chunks(split_units(text), **kwargs))
+
+def with_continuation(chunks: Iterable[str]) -> Iterator[Tuple[str, bool]]:
+    """
+    Pairs each chunk with a `continuation` flag: True when the previous chunk was hard-cut
+    mid-sentence (every regular boundary ends on a unit's trailing whitespace).
+    Chunks never overlap, so the flag replaces re-sending an overlap prefix for context.
+    """
+    prev = None
+    for chunk in chunks:
+        yield chunk, bool(prev) and not prev[-1].isspace()
+        prev = chunk
@@ -0,0 +1,145 @@
+import os
+import time
+import errno
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+def move_file(src, dst) -> Path:
+    """
+    Moves a file with a single os.replace (atomic, overwrites `dst`) when both paths are on one filesystem.
+    Falls back to shutil.move (copy + unlink) only across filesystems, e.g. WSL -> /mnt/c vault.
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(os.fspath(src), os.fspath(dst))
+    return Path(dst)
+
+def wait_stable(path, interval: float = 0.2, stable_iters: int = 3, timeout: float = 600.0) -> bool:
+    """
+    Waits until a file that is still being copied stops changing: size and mtime equal across
+    `stable_iters` consecutive samples `interval` apart. A finished small file returns after ~0.6 s;
+    a large copy is waited out instead of being read truncated. False if the file disappears or `timeout` passes.
+    """
+    deadline = time.monotonic() + timeout
+    last, same = None, 0
+    while time.monotonic() < deadline:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        current = (st.st_size, st.st_mtime_ns)
+        same = same + 1 if current == last else 1
+        if same >= stable_iters:
+            return True
+        last = current
+        time.sleep(interval)
+    return False
+
+COPY_BLOCK = 1024 * 1024
+
+def save_stream(src, dst, size: int = 0) -> Path:
+    """
+    Streams a file-like object to `dst` in 1 MiB blocks (never the whole upload in memory).
+    Writes to `<dst>.part` and renames when complete, so a crash leaves only the .part file.
+    On Linux the target is preallocated to `size` and the kernel is told the access is sequential.
+    In-memory sources (BytesIO, Streamlit's UploadedFile) are written as slices of their buffer, without
+    the per-block bytes copies copyfileobj makes.
+    """
+    dst = Path(dst)
+    part = dst.with_suffix(dst.suffix + ".part")
+    with open(part, "wb") as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if size:
+                try:
+                    os.posix_fallocate(f.fileno(), 0, size)  # one contiguous extent instead of growing per block
+                except OSError:
+                    pass  # e.g. not supported on the filesystem; copyfileobj still works
+        if hasattr(src, "getbuffer"):
+            with src.getbuffer() as view:
+                for start in range(src.tell(), len(view), COPY_BLOCK):
+                    f.write(view[start:start + COPY_BLOCK])
+        else:
+            shutil.copyfileobj(src, f, COPY_BLOCK)
+        f.truncate()
+    os.replace(part, dst)
+    return dst
+
+def read_tail(path, n: int, block: int = 64 * 1024) -> List[bytes]:
+    """
+    Last `n` lines of a file (without line endings), reading backwards in `block`-sized chunks
+    only until enough newlines are seen: memory follows the tail, not the file size.
+    """
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        chunks: List[bytes] = []
+        newlines = 0
+        # n + 1 newlines guarantee the first of the n lines is complete (a trailing newline counts too)
+        while pos > 0 and newlines <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+    chunks.reverse()
+    return b"".join(chunks).splitlines()[-n:] if n > 0 else []
+
+def iter_md_files(root) -> Iterator[os.DirEntry]:
+    """
+    Yields the .md entries under `root` (dot-directories like .obsidian/.trash and dotfiles skipped).
+    scandir-based: no Path object per entry, and the type check comes from the directory listing itself.
+    """
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for e in it:
+                    if e.name.startswith('.'):
+                        continue
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.name.endswith(".md"):
+                        yield e
+        except OSError:
+            continue
+
+# Per-directory scan results: path -> (mtime_ns, .md files directly inside, subdirectories)
+_md_dir_cache: Dict[str, Tuple[int, int, List[str]]] = {}
+
+def count_md_files(root: str) -> int:
+    """
+    Counts .md files under `root` (dot-directories like .obsidian/.trash skipped).
+    A directory whose mtime is unchanged since the last call is not listed again: one stat() per
+    directory instead of a scandir of every entry, so an unchanged vault costs O(directories).
+    """
+    total = 0
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            _md_dir_cache.pop(path, None)
+            continue
+        cached = _md_dir_cache.get(path)
+        if cached is None or cached[0] != mtime_ns:
+            count, subdirs = 0, []
+            try:
+                with os.scandir(path) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False):
+                            if not e.name.startswith('.'):
+                                subdirs.append(e.path)
+                        elif e.name.endswith(".md"):
+                            count += 1
+            except OSError:
+                continue
+            cached = _md_dir_cache[path] = (mtime_ns, count, subdirs)
+        total += cached[1]
+        stack.extend(cached[2])
+    return total
@@ -0,0 +1,89 @@
+import os
+import logging
+from pathlib import Path
+from typing import Any, Dict
+
+import orjson
+
+logger = logging.getLogger("Inbox")
+
+# Sidecar with just the display metadata, written next to every payload
+HEADER_SUFFIX = ".meta.json"
+
+# Transcript characters stored in the header for the Refinery preview
+PREVIEW_CHARS = 1000
+
+def header_path(payload_path: Path) -> Path:
+    return payload_path.with_name(payload_path.stem + HEADER_SUFFIX)
+
+def is_payload_name(name: str) -> bool:
+    """True for inbox payloads (`*.json`), False for sidecar headers."""
+    return name.endswith(".json") and not name.endswith(HEADER_SUFFIX)
+
+def make_header(payload: Dict[str, Any]) -> Dict[str, Any]:
+    meta = payload.get('meta', {})
+    return {
+        "title": meta.get('title'),
+        "uploader": meta.get('uploader'),
+        "processed_at": payload.get('processed_at', 0),
+        "preview": (payload.get('content') or '')[:PREVIEW_CHARS],
+        "audio": meta.get('local_path'),
+    }
+
+def write_payload(path: Path, payload: Dict[str, Any]):
+    """Writes the full payload plus its small header sidecar (read by the UI instead of the payload)."""
+    path = Path(path)
+    # Compact: nobody reads the payload by hand, the indented header is the human-readable part
+    path.write_bytes(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS))
+    header_path(path).write_bytes(orjson.dumps(make_header(payload), option=orjson.OPT_INDENT_2))
+
+def read_payload(path: Path) -> Dict[str, Any]:
+    return orjson.loads(Path(path).read_bytes())
+
+def read_header(path: Path) -> Dict[str, Any]:
+    """
+    Reads only the sidecar header (metadata + transcript preview, ~1 KB).
+    Payloads written before sidecars (or before the preview field) existed are parsed once and get their header backfilled.
+    """
+    path = Path(path)
+    try:
+        header = orjson.loads(header_path(path).read_bytes())
+        if "preview" in header:
+            return header
+    except FileNotFoundError:
+        pass
+    header = make_header(read_payload(path))
+    try:
+        header_path(path).write_bytes(orjson.dumps(header, option=orjson.OPT_INDENT_2))
+    except OSError as e:
+        logger.warning(f"Could not backfill header for {path.name}: {e}", extra={"tags": "INBOX"})
+    return header
+
+def archive(path: Path, archive_dir: Path) -> Path:
+    """
+    Moves a payload and its header into `archive_dir` (os.replace: atomic, overwrites on every OS).
+    The directory is only created when the first move finds it missing, so the usual case is one syscall.
+    """
+    src = os.fspath(path)
+    target = os.path.join(archive_dir, os.path.basename(src))
+    try:
+        os.replace(src, target)
+    except FileNotFoundError:
+        if os.path.isdir(archive_dir):
+            raise  # the source is gone, not the directory
+        os.makedirs(archive_dir, exist_ok=True)
+        os.replace(src, target)
+    try:
+        os.replace(header_path(Path(src)), header_path(Path(target)))
+    except FileNotFoundError:
+        pass
+    return Path(target)
+
+def delete(path: Path):
+    """Removes a payload and its header."""
+    path = Path(path)
+    path.unlink()
+    try:
+        os.unlink(header_path(path))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,61 @@
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# Spawned (not forked) so the child starts without the parent's CUDA/Streamlit state
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+class IngestJob:
+    """
+    One background ingest in its own process. The process exits when the job ends,
+    so all VRAM Whisper used goes back to the driver (not just torch's cache).
+    """
+
+    def __init__(self, fn, *args):
+        self._manager = _MP_CONTEXT.Manager()
+        self.progress = self._manager.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=_MP_CONTEXT)
+        self.future: Future = self._executor.submit(fn, *args, self.progress)
+        self.messages = []
+
+    def drain(self) -> list:
+        """Moves pending progress strings into `messages` (non-blocking) and returns them."""
+        while not self.progress.empty():
+            self.messages.append(self.progress.get_nowait())
+        return self.messages
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._manager.shutdown()
+
+def run_youtube_ingest(url: str, model_size: str, progress_queue) -> str:
+    """Worker entry point: download + transcribe to Inbox, progress strings go to `progress_queue`."""
+    from video_transcriber import create_transcriber
+    transcriber = create_transcriber(model_size=model_size)
+    return transcriber.process_to_inbox(url, progress_callback=progress_queue.put)
+
+def run_upload_ingest(audio_path: str, title: str, model_size: str, progress_queue) -> str:
+    """Worker entry point for an uploaded voice memo: transcribe and write the Inbox payload."""
+    import time
+    from config import ProjectConfig
+    from utils import inbox
+    from video_transcriber import create_transcriber
+    transcriber = create_transcriber(model_size=model_size)
+    progress_queue.put("Transkrypcja (Whisper)...")
+    transcript_data = transcriber._run_transcription_isolated(audio_path, progress_callback=progress_queue.put)
+    payload = {
+        "meta": {
+            "id": f"local-{int(time.time())}",
+            "title": title,
+            "uploader": "Marcin (Voice Memo)",
+            "duration": 0,
+            "local_path": audio_path,
+            "url": "local_file"
+        },
+        "content": transcript_data['text'],
+        "segments": transcript_data['segments'],
+        "processed_at": time.time(),
+        "status": "ready_for_refinery"
+    }
+    out_path = ProjectConfig.INBOX_DIR / f"memo-{int(time.time())}.json"
+    inbox.write_payload(out_path, payload)
+    return str(out_path)
@@ -1,9 +1,81 @@
+import re
 import json
-import ollama
 from typing import List, Dict, Any, Optional, Union
 from pydantic import BaseModel, Field
 
 from config import ProjectConfig
+from utils.ollama_client import get_client
+
+# Prompt sent for task extraction; {content} is the (possibly shortened) transcript
+TASK_PROMPT = """
+    Jesteś osobistym asystentem. Przeanalizuj poniższą notatkę głosową. 
+    Wyciągnij z niej zadania (ToDo), zakupy i ważne informacje.
+    Ignoruj przerywniki "yyy", "eee".
+    
+    TREŚĆ:
+    {content}
+    
+    Zwróć odpowiedź w formacie JSON jako listę obiektów z polami:
+    - category (String: 'Zakupy', 'Dom', 'Zdrowie', 'Finanse', 'Inne')
+    - action_item (String: Konkretne zadanie)
+    - due_date (String: YYYY-MM-DD lub null)
+    - context (String: Oryginalne zdanie/kontekst)
+    """
+
+# Decode cap + near-deterministic sampling: task lists are short, and format='json' can otherwise pad with whitespace.
+# num_ctx fixed so the input budget below can be derived from it (Ollama silently drops the overflowing start of the prompt)
+TASK_OPTIONS = {"num_predict": 1024, "temperature": 0.1, "num_ctx": 4096}
+
+# Conservative chars-per-token ratio: Polish runs ~2.7 on Llama-family tokenizers, English ~4 (no tokenizer needed)
+CHARS_PER_TOKEN = 2.5
+# Tokens reserved for the chat template and role markers around the prompt
+TASK_TEMPLATE_TOKENS = 64
+
+# Transcript characters sent for task extraction (~7k); longer notes keep their start and end
+TASK_INPUT_CHARS = int(
+    (TASK_OPTIONS["num_ctx"] - TASK_OPTIONS["num_predict"] - TASK_TEMPLATE_TOKENS) * CHARS_PER_TOKEN
+) - len(TASK_PROMPT)
+
+def _head_and_tail(text: str, max_chars: int = TASK_INPUT_CHARS) -> str:
+    """
+    Fits a long transcript into the budget with its beginning (context) and end (conclusions,
+    where action items usually are); the middle is replaced by a marker.
+    """
+    if len(text) <= max_chars:
+        return text
+    half = (max_chars - len("\n[...]\n")) // 2
+    return f"{text[:half]}\n[...]\n{text[-half:]}"
+
+# `[]`, `{}` or `{"tasks": []` at the start of the stream: nothing to extract, stop generating
+_EMPTY_RESULT = re.compile(r'\s*(\[\s*\]|\{\s*\}|\{\s*"[^"]*"\s*:\s*\[\s*\])')
+
+def _stream_json(model: str, prompt: str) -> Any:
+    """
+    Streams a format='json' chat and stops as soon as the answer is known: an empty result,
+    or a complete JSON document (the rest of the stream would only be padding).
+    """
+    content = ""
+    stream = get_client().chat(
+        model=model,
+        messages=[{'role': 'user', 'content': prompt}],
+        format='json',
+        stream=True,
+        options=TASK_OPTIONS,
+    )
+    try:
+        for chunk in stream:
+            piece = chunk['message']['content']
+            content += piece
+            if _EMPTY_RESULT.match(content):
+                return []
+            if piece.rstrip().endswith(("]", "}")):
+                try:
+                    return json.loads(content)
+                except ValueError:
+                    pass  # a nested bracket closed, not the document
+    finally:
+        stream.close()  # drops the connection, Ollama stops decoding
+    return json.loads(content)
 
 # Definicja struktury dla Bielika/Llamy (Structured Output emulation)
 class LifeAdminItem(BaseModel):
@@ -19,29 +91,10 @@ def process_voice_note_for_life(text_content: str, model_name: Optional[str] = N
     # Use fast model by default for JSON tasks as it's often better tuned for it or just faster
     model = model_name or ProjectConfig.OLLAMA_MODEL_FAST 
     
-    prompt = f"""
-    Jesteś osobistym asystentem. Przeanalizuj poniższą notatkę głosową. 
-    Wyciągnij z niej zadania (ToDo), zakupy i ważne informacje.
-    Ignoruj przerywniki "yyy", "eee".
-    
-    TREŚĆ:
-    {text_content}
-    
-    Zwróć odpowiedź w formacie JSON jako listę obiektów z polami:
-    - category (String: 'Zakupy', 'Dom', 'Zdrowie', 'Finanse', 'Inne')
-    - action_item (String: Konkretne zadanie)
-    - due_date (String: YYYY-MM-DD lub null)
-    - context (String: Oryginalne zdanie/kontekst)
-    """
+    prompt = TASK_PROMPT.format(content=_head_and_tail(text_content))
     
     try:
-        response = ollama.chat(
-            model=model,
-            messages=[{'role': 'user', 'content': prompt}],
-            format='json'
-        )
-        content = response['message']['content']
-        data = json.loads(content)
+        data = _stream_json(model, prompt)
         
         # Ollama sometimes returns a dict with a key holding the list, or just the list.
         # Let's normalize.
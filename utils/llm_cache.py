@@ -0,0 +1,57 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import ProjectConfig
+
+logger = logging.getLogger("LLMCache")
+
+# Above this temperature responses are not reproducible enough to be worth caching
+MAX_CACHEABLE_TEMPERATURE = 0.5
+
+class LLMCache:
+    """
+    Exact-match on-disk cache for near-deterministic LLM responses.
+    Keys are SHA256 of (model, messages, temperature); values are raw response text.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else ProjectConfig.CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> str:
+        payload = {'m': model, 'msgs': messages, 't': (options or {}).get('temperature')}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def is_cacheable(options: Optional[Dict[str, Any]] = None) -> bool:
+        temperature = (options or {}).get('temperature')
+        return temperature is not None and temperature <= MAX_CACHEABLE_TEMPERATURE
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.txt"
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            return self._path(key).read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Cache read failed for {key[:12]}: {e}", extra={"tags": "LLM-CACHE"})
+            return None
+
+    def set(self, key: str, value: str):
+        path = self._path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Write-then-rename so concurrent readers never see a partial entry
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(value, encoding='utf-8')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {key[:12]}: {e}", extra={"tags": "LLM-CACHE"})
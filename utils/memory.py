@@ -1,5 +1,5 @@
-import torch
 import gc
+import sys
 import logging
 
 logger = logging.getLogger("MemoryManager")
@@ -9,6 +9,11 @@ def release_vram():
     Aggressively releases VRAM by invoking garbage collection and emptying the CUDA cache.
     Crucial for swapping between large models (e.g., Whisper -> Ollama) on consumer GPUs.
     """
+    # torch is heavy to import; if nothing loaded it, it holds no cached CUDA blocks to release
+    torch = sys.modules.get("torch")
+    if torch is None:
+        gc.collect()
+        return
     if torch.cuda.is_available():
         logger.info("Releasing VRAM...", extra={"tags": "RESOURCE-MGT"})
         
@@ -0,0 +1,80 @@
+import contextlib
+import functools
+import logging
+import threading
+
+import httpx
+import ollama
+
+from config import ProjectConfig
+
+# Long chunk generations on local models can take minutes
+OLLAMA_TIMEOUT = 600.0
+OLLAMA_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+
+# keep_alive added to every call of this process's clients; None = Ollama's default (unload after 5 idle minutes)
+_keep_alive: "str | None" = None
+
+def set_keep_alive(value: "str | None"):
+    """Process-wide keep_alive for the shared clients; long-running services (BrainGuard) opt in, the UI does not."""
+    global _keep_alive
+    _keep_alive = value
+
+def _with_keep_alive(method):
+    """Adds the process keep_alive (set_keep_alive) unless it is unset or the call passes its own."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _keep_alive is not None:
+            kwargs.setdefault("keep_alive", _keep_alive)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+class _KeepAliveClient(ollama.Client):
+    # Without keep_alive Ollama unloads a model after 5 idle minutes; sparse BrainGuard events then pay a reload each
+    chat = _with_keep_alive(ollama.Client.chat)
+    generate = _with_keep_alive(ollama.Client.generate)
+    embed = _with_keep_alive(ollama.Client.embed)
+    embeddings = _with_keep_alive(ollama.Client.embeddings)
+
+class _KeepAliveAsyncClient(ollama.AsyncClient):
+    chat = _with_keep_alive(ollama.AsyncClient.chat)
+    generate = _with_keep_alive(ollama.AsyncClient.generate)
+    embed = _with_keep_alive(ollama.AsyncClient.embed)
+    embeddings = _with_keep_alive(ollama.AsyncClient.embeddings)
+
+def preload(*models: str):
+    """Loads `models` into Ollama on a daemon thread (empty prompt = load only), so the first real request skips the cold load."""
+    def _load():
+        for model in models:
+            try:
+                get_client().generate(model=model, prompt="")
+            except Exception as e:
+                logging.getLogger("Ollama").warning(f"Preload of {model} failed: {e}", extra={"tags": "OLLAMA"})
+    threading.Thread(target=_load, name="ollama-preload", daemon=True).start()
+
+_lock = threading.Lock()
+_client: "ollama.Client | None" = None
+
+def get_client() -> ollama.Client:
+    """
+    Process-wide sync client (httpx.Client is thread-safe) with pooled keep-alive connections.
+    Unlike ollama's module-level functions it honours ProjectConfig.OLLAMA_URL.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _KeepAliveClient(host=ProjectConfig.OLLAMA_URL, timeout=OLLAMA_TIMEOUT, limits=OLLAMA_LIMITS)
+    return _client
+
+@contextlib.asynccontextmanager
+async def async_client():
+    """
+    Per-call AsyncClient: httpx async pools are bound to the loop they first ran on, and callers run
+    short-lived loops (asyncio.run), so its connections are closed on exit instead of cached.
+    """
+    client = _KeepAliveAsyncClient(host=ProjectConfig.OLLAMA_URL, timeout=OLLAMA_TIMEOUT, limits=OLLAMA_LIMITS)
+    try:
+        yield client
+    finally:
+        await client._client.aclose()
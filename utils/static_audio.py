@@ -0,0 +1,52 @@
+import os
+import hashlib
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import quote
+
+# Served by Streamlit at app/static/audio/ (server.enableStaticServing), with HTTP range requests
+STATIC_AUDIO_DIR = Path(__file__).resolve().parent.parent / "static" / "audio"
+STATIC_AUDIO_URL = "app/static/audio/"
+
+def audio_source(path: Path, static_dir: Path = STATIC_AUDIO_DIR) -> Optional[Union[str, Path]]:
+    """
+    Browser-streamable URL for a local recording: a hard link under static/, so Streamlit neither loads
+    nor base64-encodes the file. Returns the Path itself (for in-memory st.audio) when linking fails,
+    e.g. across filesystems; None if the recording is gone.
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    # Keyed by location and version: same-named recordings from different folders (or a re-recorded
+    # file) never resolve to a stale link
+    key = hashlib.blake2b(f"{path.resolve()}\0{stat.st_mtime_ns}".encode("utf-8"), digest_size=16).hexdigest()
+    name = key + path.suffix
+    target = static_dir / name
+    try:
+        os.link(path, target)
+    except FileExistsError:
+        pass
+    except FileNotFoundError:
+        # first link: static/audio/ does not exist yet
+        static_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            return path
+    except OSError:
+        return path
+    return STATIC_AUDIO_URL + quote(name)
+
+def prune_audio_links(static_dir: Path = STATIC_AUDIO_DIR):
+    """Removes static links whose recording was deleted (link count 1: only the link keeps the data alive)."""
+    try:
+        entries = list(os.scandir(static_dir))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_nlink <= 1:
+                os.unlink(entry.path)
+        except OSError:
+            pass
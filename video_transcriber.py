@@ -1,21 +1,34 @@
 import os
-import json
 import time
-import torch
 import logging
+import threading
+from collections import OrderedDict
 import yt_dlp
 import warnings
 from typing import List, Dict, Any, Optional
 from pathlib import Path
+import ctranslate2
 from faster_whisper import WhisperModel
-from pyannote.audio import Pipeline
 
 from config import ProjectConfig, logger
 from utils.memory import release_vram
+from utils import inbox
 
 # Silence annoying warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="torchaudio")
 
+# Resident Whisper models (WHISPER_KEEP_LOADED), least recently used evicted first
+MAX_RESIDENT_MODELS = 2
+_resident_models: "OrderedDict[tuple, WhisperModel]" = OrderedDict()
+_resident_lock = threading.Lock()
+
+def unload_models():
+    """Drops all resident Whisper models and returns their VRAM."""
+    with _resident_lock:
+        _resident_models.clear()
+    logger.info("Unloaded resident Whisper models.", extra={"tags": "MODEL-UNLOAD"})
+    release_vram()
+
 class VideoTranscriber:
     """
     Advanced Media Transcription & Diarization Pipeline (ETL Optimized).
@@ -26,14 +39,20 @@ class VideoTranscriber:
     - Outputs raw JSON to INBOX_DIR for asynchronous processing.
     """
 
-    def __init__(self, model_size: str = "medium"):
+    def __init__(self, model_size: str = "medium", compute_type: Optional[str] = None, language: Optional[str] = None):
         self.model_size = model_size
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.compute_type = "float16" if self.device == "cuda" else "int8"
+        # Asked from CTranslate2 (faster-whisper's backend) so torch is never imported just for this
+        self.device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        # int8 weights, fp16 activations: less VRAM and faster decode than plain float16 at the same accuracy
+        self.compute_type = (
+            compute_type or ProjectConfig.WHISPER_COMPUTE_TYPE
+            or ("int8_float16" if self.device == "cuda" else "int8")
+        )
+        self.language = language or ProjectConfig.WHISPER_LANGUAGE
         self.logger = logging.getLogger("VideoTranscriber")
         
         self.logger.info(
-            f"Initialized VideoTranscriber (Stateless Mode). Device: {self.device}", 
+            f"Initialized VideoTranscriber (Stateless Mode). Device: {self.device} ({self.compute_type})", 
             extra={"tags": "MEDIA-INIT"}
         )
 
@@ -92,30 +111,26 @@ class VideoTranscriber:
         Main Pipeline: Download -> Transcribe -> Save to Inbox -> Release VRAM.
         Returns the path to the saved JSON file.
         """
+        # 1. Download
         try:
-            # 1. Download
             meta = self.download_video(url, progress_callback)
-            audio_path = meta['local_path']
+        except Exception as e:
+            self.logger.error(f"ETL Process Failed: {e}", extra={"tags": "FATAL"})
+            raise
+        return self.transcribe_to_inbox(meta, progress_callback)
 
-            # 2. Transcribe (Load -> Run -> Unload)
-            transcript_data = self._run_transcription_isolated(audio_path, progress_callback)
-            
-            # 3. Construct Payload
-            payload = {
-                "meta": meta,
-                "content": transcript_data['text'],
-                "segments": transcript_data['segments'],
-                "processed_at": time.time(),
-                "status": "ready_for_refinery"
-            }
+    def transcribe_to_inbox(self, meta: Dict[str, Any], progress_callback=None) -> str:
+        """
+        Second half of process_to_inbox for an already downloaded video (`meta` from download_video).
+        Lets callers download the next video while this one is transcribed.
+        """
+        try:
+            # 2-3. Transcribe (Load -> Run -> Unload) and construct Payload
+            payload = self._transcribe_video(meta, progress_callback)
 
             # 4. Save to INBOX
-            safe_title = "".join([c for c in meta['id'] if c.isalnum() or c in ('-','_')])
-            output_filename = f"{safe_title}.json"
-            output_path = ProjectConfig.INBOX_DIR / output_filename
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(payload, f, indent=2, ensure_ascii=False)
+            output_path = self._video_payload_path(meta)
+            inbox.write_payload(output_path, payload)
                 
             self.logger.info(f"Saved payload to Inbox: {output_path}", extra={"tags": "ETL-LOAD"})
             return str(output_path)
@@ -124,52 +139,197 @@ class VideoTranscriber:
             self.logger.error(f"ETL Process Failed: {e}", extra={"tags": "FATAL"})
             raise
 
-    def process_local_file(self, file_path: str, progress_callback=None) -> str:
+    def transcribe_payload(self, meta: Dict[str, Any], progress_callback=None) -> Dict[str, Any]:
+        """
+        transcribe_to_inbox for callers that continue in memory: returns the payload, which is
+        written to INBOX_DIR only with PERSIST_TRANSCRIPT_JSON.
+        """
+        payload = self._transcribe_video(meta, progress_callback)
+        if ProjectConfig.PERSIST_TRANSCRIPT_JSON:
+            inbox.write_payload(self._video_payload_path(meta), payload)
+        return payload
+
+    def _transcribe_video(self, meta: Dict[str, Any], progress_callback=None) -> Dict[str, Any]:
+        transcript_data = self._run_transcription_isolated(meta['local_path'], progress_callback)
+        return {
+            "meta": meta,
+            "content": transcript_data['text'],
+            "segments": transcript_data['segments'],
+            "processed_at": time.time(),
+            "status": "ready_for_refinery"
+        }
+
+    @staticmethod
+    def _video_payload_path(meta: Dict[str, Any]) -> Path:
+        safe_title = "".join([c for c in meta['id'] if c.isalnum() or c in ('-','_')])
+        return ProjectConfig.INBOX_DIR / f"{safe_title}.json"
+
+    def process_local_file(self, file_path: str, progress_callback=None) -> Dict[str, Any]:
         """
-        Process a local audio file directly (Watchdog mode).
+        Process a local audio file directly (Watchdog mode). Returns the Inbox payload; it is written
+        to INBOX_DIR only with PERSIST_TRANSCRIPT_JSON (callers use the returned dict, not the file).
         """
         try:
             path = Path(file_path)
             if not path.exists():
                 raise FileNotFoundError(f"File not found: {file_path}")
 
-            # 1. Metadata
-            meta = {
-                "id": path.stem,
-                "title": path.stem,
-                "uploader": "Local User",
-                "duration": 0, # Could be extracted with ffmpeg/pydub if needed
-                "local_path": str(path),
-                "url": "local"
-            }
-
-            # 2. Transcribe
+            # 1-2. Transcribe
             transcript_data = self._run_transcription_isolated(str(path), progress_callback)
 
-            # 3. Construct Payload
-            payload = {
-                "meta": meta,
-                "content": transcript_data['text'],
-                "segments": transcript_data['segments'],
-                "processed_at": time.time(),
-                "status": "ready_for_refinery"
-            }
-
-            # 4. Save to INBOX (System Inbox for processing)
-            safe_title = "".join([c for c in meta['id'] if c.isalnum() or c in ('-','_')])
-            output_filename = f"{safe_title}.json"
-            output_path = ProjectConfig.INBOX_DIR / output_filename
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(payload, f, indent=2, ensure_ascii=False)
-                
-            self.logger.info(f"Saved local payload to Inbox: {output_path}", extra={"tags": "ETL-LOAD-LOCAL"})
-            return str(output_path)
+            # 3-4. Construct Payload and save to INBOX (System Inbox for processing)
+            payload = self._local_payload(path, transcript_data)
+            if ProjectConfig.PERSIST_TRANSCRIPT_JSON:
+                output_path = self._local_payload_path(path)
+                inbox.write_payload(output_path, payload)
+                self.logger.info(f"Saved local payload to Inbox: {output_path}", extra={"tags": "ETL-LOAD-LOCAL"})
+            return payload
 
         except Exception as e:
             self.logger.error(f"Local Process Failed: {e}", extra={"tags": "FATAL"})
             raise
 
+    def _local_payload(self, path: Path, transcript_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Inbox payload for a transcribed local audio file."""
+        meta = {
+            "id": path.stem,
+            "title": path.stem,
+            "uploader": "Local User",
+            "duration": 0, # Could be extracted with ffmpeg/pydub if needed
+            "local_path": str(path),
+            "url": "local"
+        }
+        return {
+            "meta": meta,
+            "content": transcript_data['text'],
+            "segments": transcript_data['segments'],
+            "processed_at": time.time(),
+            "status": "ready_for_refinery"
+        }
+
+    @staticmethod
+    def _local_payload_path(path: Path) -> Path:
+        safe_title = "".join([c for c in path.stem if c.isalnum() or c in ('-','_')])
+        return ProjectConfig.INBOX_DIR / f"{safe_title}.json"
+
+    def _save_local_payload(self, path: Path, transcript_data: Dict[str, Any]) -> Path:
+        """Builds the Inbox payload for a local audio file and writes it (with header sidecar)."""
+        output_path = self._local_payload_path(path)
+        inbox.write_payload(output_path, self._local_payload(path, transcript_data))
+        return output_path
+
+    def _load_model(self) -> WhisperModel:
+        key = (self.model_size, self.device, self.compute_type)
+        if ProjectConfig.WHISPER_KEEP_LOADED:
+            with _resident_lock:
+                model = _resident_models.get(key)
+                if model is not None:
+                    _resident_models.move_to_end(key)
+                    return model
+        self.logger.info(f"Loading Whisper ({self.model_size})...", extra={"tags": "MODEL-LOAD"})
+        model = WhisperModel(
+            self.model_size, 
+            device=self.device, 
+            compute_type=self.compute_type
+        )
+        if ProjectConfig.WHISPER_KEEP_LOADED:
+            with _resident_lock:
+                _resident_models[key] = model
+                while len(_resident_models) > MAX_RESIDENT_MODELS:
+                    _resident_models.popitem(last=False)
+        return model
+
+    def _release_model(self):
+        """After a run: frees VRAM unless models are kept resident (then unload_models() frees it)."""
+        if ProjectConfig.WHISPER_KEEP_LOADED:
+            return
+        self.logger.info("Unloaded Whisper.", extra={"tags": "MODEL-UNLOAD"})
+        release_vram()
+
+    @staticmethod
+    def _collect_segments(segments_gen, info, progress_callback=None) -> Dict[str, Any]:
+        """Drains a faster-whisper segment generator into the payload text/segments."""
+        segments_list = []
+        
+        total_duration = info.duration
+        last_percent = -1
+        for segment in segments_gen:
+            segments_list.append({
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text.strip()
+            })
+            
+            # Optional visual feedback, only when the percentage moves
+            # (in the ingest process every call is a round-trip to the Manager queue)
+            if progress_callback and total_duration > 0:
+                percent = int((segment.end / total_duration) * 100)
+                if percent != last_percent:
+                    last_percent = percent
+                    progress_callback(f"Transkrypcja: {percent}%")
+
+        # Text is joined once at the end from the segments (no second per-segment list)
+        return {
+            "text": " ".join(seg["text"] for seg in segments_list),
+            "segments": segments_list
+        }
+
+    def transcribe_batch(self, paths: List[str], batch_size: int = 16, progress_callback=None) -> Dict[str, Dict[str, Any]]:
+        """
+        Transcribes many local files with a single model load.
+        Uses faster-whisper's BatchedInferencePipeline (batched encoder passes) when the installed
+        version has it, otherwise runs the files sequentially on the same model.
+        Returns {path: transcript_data}; failed files are logged and left out.
+        """
+        # Similar lengths next to each other; file size stands in for duration (no extra decoding pass)
+        ordered = sorted(paths, key=lambda p: os.path.getsize(p))
+        results: Dict[str, Dict[str, Any]] = {}
+        model = pipeline = transcribe = None
+        try:
+            release_vram()
+            if progress_callback: progress_callback("Ładowanie modelu Whisper...")
+            model = self._load_model()
+            try:
+                from faster_whisper import BatchedInferencePipeline
+                pipeline = BatchedInferencePipeline(model=model)
+                transcribe = lambda p: pipeline.transcribe(p, batch_size=batch_size, vad_filter=True, language=self.language)
+            except ImportError:
+                transcribe = lambda p: model.transcribe(p, vad_filter=True, language=self.language)
+
+            for i, audio_path in enumerate(ordered, start=1):
+                if progress_callback: progress_callback(f"Transkrypcja {i}/{len(ordered)}: {Path(audio_path).name}")
+                try:
+                    segments_gen, info = transcribe(audio_path)
+                    results[audio_path] = self._collect_segments(segments_gen, info)
+                except Exception as e:
+                    self.logger.error(f"Batch transcription failed for {audio_path}: {e}", extra={"tags": "WHISPER"})
+            return results
+        finally:
+            # Drop every reference to the model before releasing VRAM
+            transcribe = pipeline = None
+            if model:
+                del model
+            self._release_model()
+
+    def batch_to_inbox(self, paths: List[str], progress_callback=None) -> Dict[str, str]:
+        """Batch-transcribes local audio files and writes one Inbox payload per file. Returns {audio: payload}."""
+        transcripts = self.transcribe_batch(paths, progress_callback=progress_callback)
+        saved = {p: str(self._save_local_payload(Path(p), data)) for p, data in transcripts.items()}
+        self.logger.info(f"Saved {len(saved)} batch payloads to Inbox.", extra={"tags": "ETL-LOAD-LOCAL"})
+        return saved
+
+    def batch_to_payloads(self, paths: List[str], progress_callback=None) -> Dict[str, Dict[str, Any]]:
+        """
+        Like batch_to_inbox, but returns {audio: payload} for callers that continue in memory;
+        the payloads are written to INBOX_DIR only with PERSIST_TRANSCRIPT_JSON.
+        """
+        transcripts = self.transcribe_batch(paths, progress_callback=progress_callback)
+        payloads = {p: self._local_payload(Path(p), data) for p, data in transcripts.items()}
+        if ProjectConfig.PERSIST_TRANSCRIPT_JSON:
+            for p, payload in payloads.items():
+                inbox.write_payload(self._local_payload_path(Path(p)), payload)
+        return payloads
+
     def _run_transcription_isolated(self, audio_path: str, progress_callback=None) -> Dict[str, Any]:
         """
         Runs Whisper in an isolated manner. Loads model, processes, then forces unload.
@@ -179,42 +339,14 @@ class VideoTranscriber:
             # Ensure VRAM is clean before starting
             release_vram()
             
-            self.logger.info(f"Loading Whisper ({self.model_size})...", extra={"tags": "MODEL-LOAD"})
             if progress_callback: progress_callback("Ładowanie modelu Whisper...")
-            
-            model = WhisperModel(
-                self.model_size, 
-                device=self.device, 
-                compute_type=self.compute_type
-            )
+            model = self._load_model()
             
             self.logger.info("Transcribing...", extra={"tags": "WHISPER"})
             if progress_callback: progress_callback("Transkrypcja w toku...")
             
-            segments_gen, info = model.transcribe(audio_path, vad_filter=True)
-            
-            segments_list = []
-            full_text_parts = []
-            
-            total_duration = info.duration
-            for segment in segments_gen:
-                text = segment.text.strip()
-                segments_list.append({
-                    "start": segment.start,
-                    "end": segment.end,
-                    "text": text
-                })
-                full_text_parts.append(text)
-                
-                # Optional visual feedback
-                if progress_callback and total_duration > 0:
-                    percent = int((segment.end / total_duration) * 100)
-                    progress_callback(f"Transkrypcja: {percent}%")
-
-            return {
-                "text": " ".join(full_text_parts),
-                "segments": segments_list
-            }
+            segments_gen, info = model.transcribe(audio_path, vad_filter=True, language=self.language)
+            return self._collect_segments(segments_gen, info, progress_callback)
 
         except Exception as e:
             raise e
@@ -222,8 +354,54 @@ class VideoTranscriber:
             # CRITICAL: Clean up
             if model:
                 del model
-            self.logger.info("Unloaded Whisper.", extra={"tags": "MODEL-UNLOAD"})
-            release_vram()
+            self._release_model()
 
     # Note: Diarization temporarily removed to focus on Whisper stability in Phase 1. 
-    # Can be re-added as a separate isolated step in _run_diarization_isolated if needed.
\ No newline at end of file
+    # Can be re-added as a separate isolated step in _run_diarization_isolated if needed.
+
+class RemoteTranscriber(VideoTranscriber):
+    """
+    VideoTranscriber whose Whisper runs in transcriber_server.py, so the app and BrainGuard share one resident model.
+    Downloads and Inbox writes stay local; only transcription crosses the socket. Falls back to local
+    transcription when the server is not reachable.
+    """
+
+    def __init__(self, socket_path: str, model_size: str = "medium"):
+        super().__init__(model_size=model_size)
+        self.socket_path = str(socket_path)
+
+    def _call(self, request: Dict[str, Any], progress_callback=None) -> Any:
+        from multiprocessing.connection import Client
+        with Client(self.socket_path, family="AF_UNIX") as conn:
+            conn.send({**request, "model_size": self.model_size})
+            while True:
+                reply = conn.recv()
+                if "progress" in reply:
+                    if progress_callback: progress_callback(reply["progress"])
+                elif "error" in reply:
+                    raise RuntimeError(f"Transcriber server: {reply['error']}")
+                else:
+                    return reply["result"]
+
+    def _run_transcription_isolated(self, audio_path: str, progress_callback=None) -> Dict[str, Any]:
+        try:
+            return self._call({"op": "transcribe", "path": os.path.abspath(audio_path)}, progress_callback)
+        except (ConnectionRefusedError, FileNotFoundError):
+            self.logger.warning("Transcriber server unreachable, transcribing locally.", extra={"tags": "WHISPER"})
+            return super()._run_transcription_isolated(audio_path, progress_callback)
+
+    def transcribe_batch(self, paths: List[str], batch_size: int = 16, progress_callback=None) -> Dict[str, Dict[str, Any]]:
+        # Keyed by the caller's paths, not the absolute ones sent to the server
+        absolute = {os.path.abspath(p): p for p in paths}
+        try:
+            results = self._call({"op": "transcribe_batch", "paths": list(absolute), "batch_size": batch_size}, progress_callback)
+        except (ConnectionRefusedError, FileNotFoundError):
+            self.logger.warning("Transcriber server unreachable, transcribing locally.", extra={"tags": "WHISPER"})
+            return super().transcribe_batch(paths, batch_size, progress_callback)
+        return {absolute[p]: data for p, data in results.items()}
+
+def create_transcriber(model_size: str = "medium") -> VideoTranscriber:
+    """The shared server's transcriber while transcriber_server.py is running, otherwise a local one."""
+    if os.path.exists(ProjectConfig.TRANSCRIBER_SOCKET):
+        return RemoteTranscriber(ProjectConfig.TRANSCRIBER_SOCKET, model_size)
+    return VideoTranscriber(model_size=model_size)
@@ -1,5 +1,4 @@
 import datetime
-import ollama
 import sys
 import os
 from pathlib import Path
@@ -8,6 +7,7 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import ProjectConfig
+from utils.ollama_client import get_client
 
 def run_weekly_review():
     today = datetime.date.today()
@@ -16,7 +16,7 @@ def run_weekly_review():
     dates.reverse() # Chronological order
     
     daily_dir = ProjectConfig.OBSIDIAN_VAULT / "Daily"
-    notes_content = ""
+    notes_parts = []
     found_count = 0
     
     print(f"Collecting notes from {dates[0]} to {dates[-1]}...")
@@ -25,13 +25,15 @@ def run_weekly_review():
         filename = f"{date.strftime('%Y-%m-%d')}.md"
         path = daily_dir / filename
         
-        if path.exists():
+        try:
             content = path.read_text(encoding='utf-8')
-            notes_content += f"\n\n--- Dzień: {date} ---\n{content}"
-            found_count += 1
-        else:
+        except FileNotFoundError:
             print(f"Missing: {filename}")
+            continue
+        notes_parts.append(f"\n\n--- Dzień: {date} ---\n{content}")
+        found_count += 1
     
+    notes_content = "".join(notes_parts)
     if not notes_content:
         print("No daily notes found for this week.")
         return
@@ -57,7 +59,7 @@ def run_weekly_review():
     """
     
     try:
-        response = ollama.chat(
+        response = get_client().chat(
             model=ProjectConfig.OLLAMA_MODEL,
             messages=[{'role': 'user', 'content': prompt}]
         )